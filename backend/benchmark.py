@@ -0,0 +1,632 @@
+"""End-to-end load benchmark for the career guidance API.
+
+Simulated users walk real QUESTION_TREE paths (/start -> /answer* -> /chat -> /analyze)
+against the app with the mock LLM backend, in-process over ASGI, so runs are offline and
+repeatable. Results are written as JSON; pass --compare to diff against an earlier run.
+
+    python benchmark.py --users 200 --concurrency 20 --output results.json
+    python benchmark.py --compare results.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+CHAT_MESSAGES = [
+    "Which skill should I learn first?",
+    "How do I get my first internship?",
+    "Is a certification worth it for me?",
+    "What projects would impress recruiters?",
+    "How long until I am job ready?"
+]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=100, help="simulated users in the flow phase")
+    parser.add_argument("--concurrency", type=int, default=20, help="users in flight at once")
+    parser.add_argument("--phases", default="flow,answer,mixed,parser,memory,similar,prompts",
+                        help="comma-separated subset of flow, answer, mixed, parser, memory, similar, prompts")
+    parser.add_argument("--answer-requests", type=int, default=2000, help="requests in the /answer throughput phase")
+    parser.add_argument("--analyses", type=int, default=8, help="analyses in flight during the mixed phase")
+    parser.add_argument("--memory-sessions", type=int, default=200, help="sessions created in the memory phase")
+    parser.add_argument("--parser-iterations", type=int, default=2000)
+    parser.add_argument("--index-profiles", type=int, default=5000, help="profiles indexed in the similar phase")
+    parser.add_argument("--index-queries", type=int, default=500, help="queries per perturbation in the similar phase")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock LLM seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=250, help="mock LLM tokens per second")
+    parser.add_argument("--llm-rate", type=float, default=1000, help="scheduler calls/s (the mock has no quota)")
+    parser.add_argument("--llm-concurrency", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    return parser.parse_args(argv)
+
+def configure_environment(args):
+    """main.py reads its settings at import time, so the mock must be chosen before importing it"""
+    os.environ.setdefault("LLM_BACKEND", "mock")
+    os.environ.setdefault("LLM_MOCK_LATENCY", str(args.latency))
+    os.environ.setdefault("LLM_MOCK_TOKEN_RATE", str(args.token_rate))
+    os.environ.setdefault("LLM_RATE", str(args.llm_rate))
+    os.environ.setdefault("LLM_BURST", str(int(args.llm_rate)))
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.llm_concurrency))
+    os.environ.setdefault("LLM_MAX_QUEUE", str(args.concurrency * 16))
+    os.environ.setdefault("LLM_LOG_TOKENS", "0")
+
+def percentile(ordered: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0
+    }
+
+class Recorder:
+    """Per-endpoint latencies and error counts"""
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def request(self, client, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        self.latencies.setdefault(name, []).append(elapsed)
+        # In-process ASGI calls need not suspend; yield like a network round trip would
+        await asyncio.sleep(0)
+        if response.status_code >= 400:
+            key = f"{name} {response.status_code}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+            return None
+        return response.json()
+
+    def summary(self) -> Dict:
+        return {name: summarize(samples) for name, samples in sorted(self.latencies.items())}
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires; a blocked loop shows up as lag"""
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+        self._expected = 0.0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - self._expected, 0.0))
+
+    def __enter__(self):
+        self.samples = []
+        self._expected = asyncio.get_running_loop().time() + self.interval
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        overdue = asyncio.get_running_loop().time() - self._expected
+        if overdue > 0:
+            self.samples.append(overdue)
+        self._task.cancel()
+
+    def summary(self) -> Dict:
+        return summarize(self.samples)
+
+def choose_answers(question: Dict, rng: random.Random) -> Dict:
+    """A valid random answer to one question, sometimes with a free-text "Other" """
+    options = question["options"]
+    if question["type"] == "multiple":
+        count = rng.randint(1, min(question.get("max_selections") or 3, len(options)))
+        answers = rng.sample(options, count)
+    else:
+        answers = [rng.choice(options)]
+    payload = {"question_id": question["id"], "answers": answers}
+    if "Other (Specify)" in answers:
+        payload["custom_answer"] = rng.choice(["Robotics", "Game design", "Public policy", "Agritech"])
+    return payload
+
+async def walk_questionnaire(client, recorder: Recorder, rng: random.Random) -> Optional[str]:
+    """Answer questions from /start until the tree ends; returns the session id"""
+    data = await recorder.request(client, "/start", "GET", "/start")
+    if data is None:
+        return None
+    question = data["question"]
+    session_id = None
+    while question:
+        payload = choose_answers(question, rng)
+        payload["session_id"] = session_id
+        data = await recorder.request(client, "/answer", "POST", "/answer", json=payload)
+        if data is None:
+            return session_id
+        session_id = data["session_id"]
+        question = None if data.get("completed") else data.get("next_question")
+    return session_id
+
+async def user_flow(client, recorder: Recorder, rng: random.Random):
+    session_id = await walk_questionnaire(client, recorder, rng)
+    if session_id is None:
+        return
+    await recorder.request(client, "/chat", "POST", "/chat",
+                           json={"session_id": session_id, "message": rng.choice(CHAT_MESSAGES)})
+    await recorder.request(client, "/analyze", "POST", "/analyze", json={"session_id": session_id})
+
+async def run_bounded(count: int, concurrency: int, make_job):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def bounded(i):
+        async with limit:
+            await make_job(i)
+    await asyncio.gather(*(bounded(i) for i in range(count)))
+
+async def flow_phase(client, args) -> Dict:
+    """Full questionnaire -> chat -> analysis flows at the configured concurrency"""
+    recorder = Recorder()
+    with LoopLagMonitor() as lag:
+        started = time.perf_counter()
+        await run_bounded(args.users, args.concurrency,
+                          lambda i: user_flow(client, recorder, random.Random(args.seed * 100003 + i)))
+        elapsed = time.perf_counter() - started
+    requests = sum(len(samples) for samples in recorder.latencies.values())
+    return {
+        "duration_s": round(elapsed, 3),
+        "flows_per_s": round(args.users / elapsed, 2),
+        "requests_per_s": round(requests / elapsed, 2),
+        "endpoints": recorder.summary(),
+        "errors": recorder.errors,
+        "event_loop_lag": lag.summary()
+    }
+
+async def answer_phase(client, args) -> Dict:
+    """/answer throughput: many first answers on fresh sessions, no LLM involved"""
+    import main
+    recorder = Recorder()
+    question = main.QUESTION_TREE["start"]
+    rng = random.Random(args.seed)
+    payloads = [choose_answers(question, rng) for _ in range(args.answer_requests)]
+    with LoopLagMonitor() as lag:
+        started = time.perf_counter()
+        await run_bounded(len(payloads), args.concurrency,
+                          lambda i: recorder.request(client, "/answer", "POST", "/answer", json=payloads[i]))
+        elapsed = time.perf_counter() - started
+    return {
+        "duration_s": round(elapsed, 3),
+        "requests_per_s": round(len(payloads) / elapsed, 2),
+        "endpoints": recorder.summary(),
+        "errors": recorder.errors,
+        "event_loop_lag": lag.summary()
+    }
+
+async def mixed_phase(client, args) -> Dict:
+    """/answer latency on its own and while analyses are generating, to show that
+    a slow completion does not hold up the rest of the API"""
+    rng = random.Random(args.seed + 7)
+
+    async def answer_burst(recorder):
+        for _ in range(50):
+            await walk_questionnaire(client, recorder, rng)
+
+    idle = Recorder()
+    await answer_burst(idle)
+
+    # Distinct sessions so the analysis cache cannot short-circuit the generations
+    setup = Recorder()
+    session_ids = []
+    while len(session_ids) < args.analyses:
+        sid = await walk_questionnaire(client, setup, random.Random(rng.random()))
+        if sid:
+            await setup.request(client, "/chat", "POST", "/chat",
+                                json={"session_id": sid, "message": f"benchmark profile {len(session_ids)} {rng.random()}"})
+            session_ids.append(sid)
+
+    loaded = Recorder()
+    with LoopLagMonitor() as lag:
+        analyses = [
+            asyncio.ensure_future(loaded.request(client, "/analyze", "POST", "/analyze", json={"session_id": sid}))
+            for sid in session_ids
+        ]
+        await asyncio.sleep(0)
+        await answer_burst(loaded)
+        await asyncio.gather(*analyses)
+    return {
+        "idle": idle.summary(),
+        "during_analysis": loaded.summary(),
+        "errors": loaded.errors,
+        "event_loop_lag": lag.summary()
+    }
+
+def baseline_header(line: str) -> Optional[str]:
+    if "CAREER MATCHES" in line:
+        return "careers"
+    elif "MISSING SKILLS" in line:
+        return "skills"
+    elif "CERTIFICATIONS" in line:
+        return "certs"
+    elif "PORTFOLIO PROJECTS" in line or "PROJECTS" in line:
+        return "projects"
+    elif "ROADMAP" in line:
+        return "roadmap"
+    elif "ACTION PLAN" in line or "JOB SEARCH" in line:
+        return "job"
+    elif "PERSONALIZED ADVICE" in line:
+        return "advice"
+    return None
+
+def baseline_parse(text: str) -> Dict:
+    """The look-ahead parser AnalysisParser replaced, verbatim but without the default
+    filling; the parser phase and the parser tests compare against it"""
+    result = {
+        "career_matches": [],
+        "missing_skills": [],
+        "certifications": [],
+        "projects": [],
+        "roadmap": {},
+        "job_search": {},
+        "final_advice": "",
+        "is_personalized": True
+    }
+    
+    lines = text.split('\n')
+    current_section = None
+
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+
+        header = baseline_header(line)
+        if header:
+            current_section = header
+        if header == "advice":
+            advice_lines = []
+            for j in range(i+1, min(i+8, len(lines))):
+                if lines[j].strip() and not lines[j].startswith(('🎯', '💪', '📜', '🚀', '🗺️', '💼')):
+                    advice_lines.append(lines[j].strip())
+            result["final_advice"] = ' '.join(advice_lines)
+            continue
+
+        if current_section == "careers":
+            if line.startswith(('-', '1.', '2.', '3.')):
+                if '|' in line and '%' in line:
+                    parts = line.split('|')
+                    title = parts[0].split('.', 1)[-1].strip().strip('-').strip()
+                    match = parts[1].split('%')[0].strip()
+
+                    details = []
+                    for j in range(i+1, min(i+6, len(lines))):
+                        if lines[j].strip().startswith(('-', '•', 'Why', 'Entry', 'Salary', 'Next')):
+                            details.append(lines[j].strip().lstrip('-•').strip())
+
+                    result["career_matches"].append({
+                        "title": title,
+                        "match": match if match.isdigit() else "75",
+                        "details": details[:5]
+                    })
+
+        elif current_section == "skills":
+            if line.startswith(('-', '1.', '2.', '3.', '4.', '5.')):
+                skill_name = line.split('.', 1)[-1].strip().strip('-').strip()
+                if skill_name and len(skill_name) < 50:
+                    details = []
+                    for j in range(i+1, min(i+5, len(lines))):
+                        if lines[j].strip().startswith(('-', '•', 'Why', 'Learning', 'Best')):
+                            details.append(lines[j].strip().lstrip('-•').strip())
+
+                    result["missing_skills"].append({
+                        "skill": skill_name,
+                        "details": details[:4]
+                    })
+
+        elif current_section == "certs":
+            if line.startswith(('-', '1.', '2.', '3.', '4.')):
+                cert_name = line.split('.', 1)[-1].strip().strip('-').strip()
+                if cert_name and len(cert_name) < 60:
+                    details = []
+                    for j in range(i+1, min(i+6, len(lines))):
+                        if lines[j].strip().startswith(('-', '•', 'Why', 'Platform', 'Duration', 'Value')):
+                            details.append(lines[j].strip().lstrip('-•').strip())
+
+                    result["certifications"].append({
+                        "name": cert_name,
+                        "details": details[:5]
+                    })
+
+        elif current_section == "projects":
+            if line.startswith(('-', '1.', '2.', '3.', '4.')):
+                project_name = line.split('.', 1)[-1].strip().strip('-').strip()
+                if project_name and len(project_name) < 70:
+                    details = []
+                    for j in range(i+1, min(i+6, len(lines))):
+                        if lines[j].strip().startswith(('-', '•', 'Technologies', 'Timeline', 'What', 'Where')):
+                            details.append(lines[j].strip().lstrip('-•').strip())
+
+                    result["projects"].append({
+                        "name": project_name,
+                        "details": details[:5]
+                    })
+
+        elif current_section == "roadmap":
+            if line.startswith('Month'):
+                month_num = line.split(':')[0].strip()
+                month_content = line.split(':', 1)[1].strip() if ':' in line else ''
+                actions = [month_content] if month_content else []
+
+                for j in range(i+1, min(i+4, len(lines))):
+                    if lines[j].strip().startswith(('-', '•', '1.', '2.', '3.')):
+                        actions.append(lines[j].strip().lstrip('-•123.').strip())
+
+                result["roadmap"][month_num] = actions[:3]
+
+        elif current_section == "job":
+            if ':' in line:
+                key = line.split(':')[0].strip()
+                value = line.split(':', 1)[1].strip()
+                result["job_search"][key] = value
+
+    return result
+
+def parser_phase(args) -> Dict:
+    """CPU cost of AnalysisParser against the parser it replaced, per recorded text-mode completion"""
+    import main
+    texts = main.llm_backend.recordings.get("text", []) if isinstance(main.llm_backend, main.MockBackend) else []
+    if not texts:
+        return {"skipped": "no text recordings"}
+
+    def cpu_us(parse, text):
+        iterations = max(args.parser_iterations // len(texts), 1)
+        started = time.process_time()
+        for _ in range(iterations):
+            parse(text)
+        return round((time.process_time() - started) / iterations * 1e6, 2)
+
+    def counts(result):
+        return {key: len(value) if isinstance(value, (list, dict)) else bool(value) for key, value in result.items()}
+
+    recordings = []
+    for text in texts:
+        new_us = cpu_us(main.AnalysisParser.parse, text)
+        baseline_us = cpu_us(baseline_parse, text)
+        recordings.append({
+            "cpu_us_per_parse": new_us,
+            "baseline_cpu_us_per_parse": baseline_us,
+            "speedup": round(baseline_us / new_us, 2) if new_us else None,
+            "extracted": counts(main.AnalysisParser.parse(text)),
+            "baseline_extracted": counts(baseline_parse(text))
+        })
+    return {
+        "iterations": args.parser_iterations,
+        "cpu_us_per_parse": round(statistics.mean(r["cpu_us_per_parse"] for r in recordings), 2),
+        "baseline_cpu_us_per_parse": round(statistics.mean(r["baseline_cpu_us_per_parse"] for r in recordings), 2),
+        "recordings": recordings
+    }
+
+async def memory_phase(client, args) -> Dict:
+    """Python heap growth per completed questionnaire + chat session"""
+    import main
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    recorder = Recorder()
+    rng = random.Random(args.seed + 13)
+    for _ in range(args.memory_sessions):
+        sid = await walk_questionnaire(client, recorder, rng)
+        if sid:
+            await recorder.request(client, "/chat", "POST", "/chat",
+                                   json={"session_id": sid, "message": rng.choice(CHAT_MESSAGES)})
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    store = main.sessions.stats()
+    return {
+        "sessions": args.memory_sessions,
+        "heap_bytes_per_session": round((after - before) / args.memory_sessions),
+        "store": store
+    }
+
+def random_profile(routes, rng: random.Random) -> Dict:
+    """The profile a random walk through the question tree builds, as record_answer would"""
+    profile = {}
+    q_id = "start"
+    while q_id:
+        payload = choose_answers(routes.questions[q_id], rng)
+        answers = [f"Other: {payload['custom_answer']}" if a == "Other (Specify)" else a for a in payload["answers"]]
+        routes.apply_answer(profile, q_id, answers)
+        q_id = routes.next_question(q_id, payload["answers"])
+    return profile
+
+def similar_phase(args) -> Dict:
+    """Recall and latency of the nearest-profile index: each indexed profile, perturbed
+    the way near-duplicate users differ, should find its original above the threshold"""
+    import copy
+    import main
+    routes = main.QUESTION_ROUTES
+    rng = random.Random(args.seed + 17)
+    skill_options = sorted({
+        option for q_id, question in routes.questions.items()
+        if (routes.profile_fields.get(q_id) or (None,))[0] == "skills"
+        for option in question["options"] if option != "Other (Specify)"
+    })
+
+    index = main.ProfileIndex(args.index_profiles)
+    profiles = {}
+    add_times = []
+    for i in range(args.index_profiles):
+        key = f"profile-{i}"
+        profiles[key] = random_profile(routes, rng)
+        started = time.perf_counter()
+        index.add(key, profiles[key])
+        add_times.append(time.perf_counter() - started)
+
+    # (applies to, perturbation) - each only for profiles whose path asked that question
+    def extra_skill(profile):
+        profile["skills"].append(rng.choice([s for s in skill_options if s not in profile["skills"]]))
+
+    def other_text(profile):
+        field = "goals" if "goals" in profile else "interests"
+        profile[field].append(f"Other: {rng.choice(['drones', 'urban farming', 'esports', 'forensics'])}")
+
+    def changed_budget(profile):
+        profile["budget"] = rng.choice(routes.questions["budget"]["options"])
+
+    perturbations = {
+        "extra_skill": (lambda p: p.get("skills"), extra_skill),
+        "other_text": (lambda p: p.get("goals") or p.get("interests"), other_text),
+        "changed_budget": (lambda p: "budget" in p, changed_budget)
+    }
+    results = {"indexed": len(index), "threshold": main.SIMILAR_THRESHOLD, "add": summarize(add_times)}
+    for name, (applies, perturb) in perturbations.items():
+        keys = [key for key, profile in profiles.items() if applies(profile)]
+        found = correct = 0
+        times = []
+        for key in rng.sample(keys, min(args.index_queries, len(keys))):
+            query = copy.deepcopy(profiles[key])
+            perturb(query)
+            started = time.perf_counter()
+            match = index.nearest(query, main.SIMILAR_THRESHOLD)
+            times.append(time.perf_counter() - started)
+            if match:
+                found += 1
+                # A different key with identical terms is as good an answer as the original
+                correct += match[0] == key or main.profile_terms(profiles[match[0]]) == main.profile_terms(profiles[key])
+        results[name] = {"recall": round(correct / len(times), 3), "matched": round(found / len(times), 3),
+                         "query": summarize(times)}
+
+    # Fresh random walks: how often a new user is served a neighbour (many short paths
+    # are genuine duplicates) and how often that neighbour is on another track (never)
+    times = []
+    found = cross_track = 0
+    for _ in range(args.index_queries):
+        query = random_profile(routes, rng)
+        started = time.perf_counter()
+        match = index.nearest(query, main.SIMILAR_THRESHOLD)
+        times.append(time.perf_counter() - started)
+        if match:
+            found += 1
+            cross_track += main.ProfileIndex._track(profiles[match[0]]) != main.ProfileIndex._track(query)
+    results["random_walk"] = {"matched": round(found / len(times), 3),
+                              "cross_track": round(cross_track / len(times), 3), "query": summarize(times)}
+    return results
+
+def prompts_phase(args) -> Dict:
+    """Analysis prompt size per mode over random profiles: total input tokens, the constant
+    instruction prefix a provider can cache, and the per-user remainder"""
+    import main
+    routes = main.QUESTION_ROUTES
+    rng = random.Random(args.seed + 19)
+    agent = main.agent
+    chat = [{"role": "user", "content": rng.choice(CHAT_MESSAGES)}]
+    modes = {
+        "text": lambda p: [agent._analysis_messages(main.ANALYSIS_TEXT_PROMPT, p, chat)],
+        "json": lambda p: [agent._analysis_messages(main.analysis_json_prompt(tuple(main.ANALYSIS_SCHEMA)), p, chat)],
+        "fanout": lambda p: [agent._analysis_messages(main.analysis_json_prompt((key,)), p, chat)
+                             for key in main.ANALYSIS_SCHEMA]
+    }
+    profiles = [random_profile(routes, rng) for _ in range(200)]
+    results = {}
+    for mode, build in modes.items():
+        total = prefix = 0
+        for profile in profiles:
+            for messages in build(profile):
+                total += sum(main.estimate_tokens(m["content"]) for m in messages)
+                prefix += main.estimate_tokens(messages[0]["content"])
+        results[mode] = {
+            "prompt_tokens": round(total / len(profiles), 1),
+            "cacheable_tokens": round(prefix / len(profiles), 1),
+            "uncached_tokens": round((total - prefix) / len(profiles), 1)
+        }
+    return results
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(current: Dict, previous: Dict):
+    """Print p95 and throughput changes between two result files"""
+    def walk(new, old, path=""):
+        for key, value in new.items():
+            if key not in old:
+                continue
+            if isinstance(value, dict):
+                walk(value, old[key], f"{path}{key}.")
+            elif key in ("p95_ms", "p99_ms", "requests_per_s", "flows_per_s", "cpu_us_per_parse", "heap_bytes_per_session",
+                         "recall", "prompt_tokens", "uncached_tokens"):
+                before = old[key]
+                change = (value - before) / before * 100 if before else 0.0
+                print(f"  {path}{key:<24} {before:>12} -> {value:<12} ({change:+.1f}%)")
+    print(f"Compared with {previous.get('revision')} ({previous.get('timestamp')}):")
+    walk(current["results"], previous["results"])
+
+async def run(args) -> Dict:
+    import httpx
+    import main
+
+    phases = [p.strip() for p in args.phases.split(",") if p.strip()]
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300) as client:
+        if "flow" in phases:
+            results["flow"] = await flow_phase(client, args)
+        if "answer" in phases:
+            results["answer"] = await answer_phase(client, args)
+        if "mixed" in phases:
+            results["mixed"] = await mixed_phase(client, args)
+        if "parser" in phases:
+            results["parser"] = parser_phase(args)
+        if "memory" in phases:
+            results["memory"] = await memory_phase(client, args)
+        if "similar" in phases:
+            results["similar"] = similar_phase(args)
+        if "prompts" in phases:
+            results["prompts"] = prompts_phase(args)
+        results["llm_tokens"] = {"/".join(v for _, v in labels): int(value)
+                                 for labels, value in sorted(main.llm_tokens.values.items())}
+        results["stats"] = (await client.get("/stats")).json()
+    return results
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "environment": {k: v for k, v in os.environ.items() if k.startswith(("LLM_", "ANALYSIS_", "SESSION_"))},
+        "results": asyncio.run(run(args))
+    }
+    print(json.dumps(report["results"], indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main_cli()
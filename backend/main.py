@@ -1,17 +1,953 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, create_model
 from typing import List, Optional, Dict
-from groq import Groq
 import uvicorn
+import asyncio
+import bisect
+import copy
+import functools
+import gzip
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import math
+import mmap
 import os 
+import random
+import re
+from contextlib import asynccontextmanager, contextmanager
 from dotenv import load_dotenv
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 from datetime import datetime
+from collections import OrderedDict, deque, namedtuple
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import traceback
+import zlib
 
 load_dotenv()
-client = Groq(api_key=os.getenv("API_KEY"))
 
-app = FastAPI(title="AI Career Guidance System", version="6.0.0")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")  # "groq", "openai" (any OpenAI-compatible server) or "mock"
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b-versatile")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:8001/v1")
+LLM_MOCK_RECORDINGS = os.getenv("LLM_MOCK_RECORDINGS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_completions.jsonl"))
+LLM_MOCK_LATENCY = float(os.getenv("LLM_MOCK_LATENCY", "0.3"))  # seconds to first token
+LLM_MOCK_TOKEN_RATE = float(os.getenv("LLM_MOCK_TOKEN_RATE", "250"))  # tokens per second, 0 = instant
+LLM_MOCK_ERROR_RATE = float(os.getenv("LLM_MOCK_ERROR_RATE", "0"))
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH")
+LLM_LOG_TOKENS = os.getenv("LLM_LOG_TOKENS", "1") == "1"  # one log line per call with its token counts
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", "20"))
+CHAT_HISTORY_MAX = int(os.getenv("CHAT_HISTORY_MAX", "20"))  # messages kept verbatim per session
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "600"))  # summary + earlier turns in each chat prompt
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "200"))
+ANALYSIS_CHAT_TOKENS = int(os.getenv("ANALYSIS_CHAT_TOKENS", "300"))  # recent chat topics in analysis prompts
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", "90"))
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "json")  # "json" (schema-validated), "fanout" (parallel sections) or "text"
+ANALYSIS_FANOUT_CONCURRENCY = int(os.getenv("ANALYSIS_FANOUT_CONCURRENCY", "4"))
+ANALYSIS_TEMPLATES = os.getenv("ANALYSIS_TEMPLATES", "primary")  # "primary" (answer from templates, personalize in background), "fallback" or "off"
+
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+SESSION_MAX_MB = float(os.getenv("SESSION_MAX_MB", "256"))
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+ANALYSIS_CACHE_MAX = int(os.getenv("ANALYSIS_CACHE_MAX", "5000"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR")
+SIMILAR_REUSE = os.getenv("SIMILAR_REUSE", "seed")  # "seed" (serve the nearest analysis, personalize in background), "return" or "off"
+SIMILAR_THRESHOLD = float(os.getenv("SIMILAR_THRESHOLD", "0.8"))  # cosine similarity
+WARM_STORE_PATH = os.getenv("WARM_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "analysis_warm.bin"))
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RATE = float(os.getenv("LLM_RATE", "5"))  # calls per second
+LLM_BURST = int(os.getenv("LLM_BURST", "10"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "4"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "0") == "1"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.05"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+class Counter:
+    """Monotonic count per label set"""
+    kind = "counter"
+    
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values = {}
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0.0) + amount
+    
+    def samples(self):
+        for key, value in self.values.items():
+            yield self.name, key, value
+
+class Gauge(Counter):
+    kind = "gauge"
+    
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Histogram:
+    """Fixed-bucket histogram per label set; observing is one bisect and two additions"""
+    kind = "histogram"
+    
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [per-bucket counts (+Inf last), sum]
+    
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def samples(self):
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                yield f"{self.name}_bucket", key + (("le", le),), cumulative
+            yield f"{self.name}_sum", key, total
+            yield f"{self.name}_count", key, cumulative
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsRegistry:
+    """Metrics rendered in the Prometheus text exposition format"""
+    def __init__(self):
+        self.metrics = []
+    
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+    
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._register(Gauge(name, help))
+    
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+    
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                label_text = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+http_latency = metrics.histogram("career_http_request_duration_seconds", "Request time by route, including the response body")
+stage_latency = metrics.histogram("career_stage_duration_seconds", "Chat and analysis time by stage (prompt_build, llm_wait, parse)")
+store_latency = metrics.histogram(
+    "career_session_store_duration_seconds", "Session store operation time",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1)
+)
+llm_calls = metrics.counter("career_llm_calls_total", "LLM calls by operation and outcome")
+llm_tokens = metrics.counter("career_llm_tokens_total", "LLM tokens by operation and kind (prompt, cached prompt or completion)")
+fallbacks = metrics.counter("career_fallbacks_total", "Rule-based responses served instead of LLM output, by kind")
+active_sessions = metrics.gauge("career_active_sessions", "Sessions held by the session store")
+llm_queue_depth = metrics.gauge("career_llm_queue_depth", "LLM calls waiting for a scheduler slot")
+llm_in_flight = metrics.gauge("career_llm_in_flight", "LLM calls currently running")
+llm_circuit_open = metrics.gauge("career_llm_circuit_open", "1 while the LLM circuit breaker is open")
+analysis_cache_entries = metrics.gauge("career_analysis_cache_entries", "Analyses in the in-memory cache")
+analysis_sources = metrics.counter("career_analyses_total", "Analyses served by source (cache, incremental, warm, similar, template, llm, fallback)")
+loop_lag = metrics.histogram("career_event_loop_lag_seconds", "How late the loop monitor's timer fired")
+
+class LoopMonitor:
+    """Event-loop lag meter with a blocking-call profiler.
+    
+    A heartbeat task on the loop records how late its timer fires. A watchdog
+    thread polls the heartbeat; while the loop is stalled past `threshold` it
+    samples the loop thread's stack, so the code that blocked it shows up with
+    the time it was caught holding the loop.
+    """
+    def __init__(self, interval: float, threshold: float, max_offenders: int = 100, depth: int = 12):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_offenders = max_offenders
+        self.depth = depth
+        self.blocks = 0
+        self._lags = deque(maxlen=1000)
+        self._offenders = {}  # stack -> {"samples", "blocked_seconds", "last_seen"}
+        self._lock = threading.Lock()
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._stopped = threading.Event()
+    
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+    
+    def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+    
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0.0)
+            self._beat = time.monotonic()
+            self._lags.append(lag)
+            loop_lag.observe(lag)
+    
+    def _watch(self):
+        poll = self.threshold / 2
+        in_block = False
+        while not self._stopped.wait(poll):
+            stalled = time.monotonic() - self._beat - self.interval
+            if stalled < self.threshold:
+                in_block = False
+                continue
+            if not in_block:
+                in_block = True
+                self.blocks += 1
+                # The first poll past the threshold accounts for the whole stall so far
+                self._sample(stalled)
+            else:
+                self._sample(poll)
+    
+    def _sample(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        stack = tuple(
+            f"{os.path.basename(f.filename)}:{f.lineno} in {f.name}" + (f": {f.line}" if f.line else "")
+            for f in traceback.extract_stack(frame)[-self.depth:]
+        )
+        with self._lock:
+            offender = self._offenders.get(stack)
+            if offender is None:
+                if len(self._offenders) >= self.max_offenders:
+                    del self._offenders[min(self._offenders, key=lambda k: self._offenders[k]["blocked_seconds"])]
+                offender = self._offenders[stack] = {"samples": 0, "blocked_seconds": 0.0, "last_seen": None}
+            offender["samples"] += 1
+            offender["blocked_seconds"] += blocked
+            offender["last_seen"] = datetime.now().isoformat()
+    
+    def report(self, limit: int = 10) -> Dict:
+        lags = sorted(self._lags)
+        with self._lock:
+            top = sorted(self._offenders.items(), key=lambda item: item[1]["blocked_seconds"], reverse=True)[:limit]
+        return {
+            "enabled": True,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": {
+                "p50": round(lags[len(lags) // 2] * 1000, 2) if lags else 0.0,
+                "p99": round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else 0.0,
+                "max": round(lags[-1] * 1000, 2) if lags else 0.0
+            },
+            "blocks": self.blocks,
+            "offenders": [
+                {**stats, "blocked_seconds": round(stats["blocked_seconds"], 3), "stack": list(stack)}
+                for stack, stats in top
+            ]
+        }
+
+loop_monitor = LoopMonitor(LOOP_MONITOR_INTERVAL, LOOP_BLOCK_THRESHOLD) if LOOP_MONITOR else None
+
+# Scheduler priorities: lower runs first
+PRIORITY_CHAT = 0
+PRIORITY_ANALYSIS = 1
+
+class LLMBusy(Exception):
+    """The LLM queue is full; the client should retry after `retry_after` seconds"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class LLMScheduler:
+    """Admission control in front of the LLM client.
+    
+    Calls wait in a bounded priority queue (interactive chat ahead of analysis)
+    and are released while both a concurrency slot and a token-bucket token
+    are available. When the queue is full new calls are rejected with LLMBusy.
+    """
+    def __init__(self, max_concurrency: int, rate: float, burst: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._queued = 0
+        self._in_flight = 0
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._timer = None
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+    
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._queued / self.rate))
+    
+    def check_capacity(self):
+        """Raise LLMBusy if a new call would not fit in the queue"""
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            raise LLMBusy(self.retry_after())
+    
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    async def admit(self, priority: int):
+        """Wait for a slot and a token; returns the callable that frees the slot"""
+        await self._acquire(priority)
+        return self._release
+    
+    async def _acquire(self, priority: int):
+        self.check_capacity()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._queued += 1
+        enqueued = time.monotonic()
+        self._dispatch()
+        
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as the caller went away: hand it back
+                self._release()
+            else:
+                self._queued -= 1
+            raise
+        
+        waited = time.monotonic() - enqueued
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+    
+    def _release(self):
+        self._in_flight -= 1
+        self._dispatch()
+    
+    def _dispatch(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+        
+        while self._waiters and self._in_flight < self.max_concurrency and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # cancelled while queued
+                continue
+            self._queued -= 1
+            self._tokens -= 1
+            self._in_flight += 1
+            future.set_result(None)
+        
+        if self._waiters and self._in_flight < self.max_concurrency and self._timer is None:
+            # Out of tokens: wake up when the next one is due
+            delay = (1 - self._tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+    
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+    
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queued,
+            "in_flight": self._in_flight,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "wait_seconds_max": round(self.wait_seconds_max, 3),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.admitted, 3) if self.admitted else 0.0
+        }
+
+llm_scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_RATE, LLM_BURST, LLM_MAX_QUEUE)
+
+class CircuitOpen(Exception):
+    """The provider failed repeatedly; calls are skipped until the cooldown ends"""
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures, then lets one probe through per cooldown"""
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.rejections = 0
+    
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+            self.state = "half_open"
+            self._probing = False
+        if self.state == "closed" or (self.state == "half_open" and not self._probing):
+            self._probing = self.state == "half_open"
+            return True
+        self.rejections += 1
+        return False
+    
+    def record_success(self):
+        self.state = "closed"
+        self._failures = 0
+        self._probing = False
+    
+    def record_failure(self):
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+            self._probing = False
+    
+    def release_probe(self):
+        """A half-open probe ended without an answer (it was cancelled); let the next call probe"""
+        self._probing = False
+
+async def _admitted_at_once():
+    """Admission for callers without a scheduler: immediate, nothing to release"""
+    return lambda: None
+
+def _is_retryable(error: Exception) -> bool:
+    """Client errors (bad request, auth, ...) will fail the same way again"""
+    status = getattr(error, "status_code", None)
+    return status is None or status in (408, 409, 429) or status >= 500
+
+class ResilientCaller:
+    """Deadline-bounded retries with full-jitter backoff, a circuit breaker and
+    optional hedging: a duplicate request once a call outlives the p95 latency
+    of similar calls, with the first answer winning.
+    
+    With an admit function (LLMScheduler.admit), every provider request - each
+    retry and each hedge - waits for its own slot and token and frees the slot
+    when it ends, so nothing is held during backoff. The deadline and the hedge
+    clock start once a request is admitted: queueing is not provider latency."""
+    def __init__(self, retries: int, backoff_base: float, backoff_max: float, breaker: CircuitBreaker,
+                 hedge: bool = False, hedge_min_samples: int = 20):
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = {}  # workload key -> recent successful latencies
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.hedged = 0
+    
+    def p95(self, key) -> Optional[float]:
+        samples = self._latencies.get(key)
+        if not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+    
+    async def call(self, make_call, timeout: float, key=None, hedgeable: bool = True, admit=None, hold: bool = False):
+        """Await make_call() until it succeeds, retries run out or the deadline passes.
+        
+        With hold, the winning request keeps its slot and (result, release) is returned,
+        for streams whose tokens are still flowing."""
+        loop = asyncio.get_running_loop()
+        call = {"timeout": timeout, "deadline": None, "admit": admit or _admitted_at_once, "hold": hold}
+        self.calls += 1
+        attempt = 0
+        
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpen("LLM provider circuit is open")
+            remaining = None
+            if call["deadline"] is not None:
+                remaining = call["deadline"] - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError("LLM call deadline exceeded")
+            
+            try:
+                result, latency = await asyncio.wait_for(
+                    self._attempt(make_call, key if hedgeable else None, call), remaining
+                )
+            except (LLMBusy, CircuitOpen):
+                raise
+            except asyncio.CancelledError:
+                # A disconnected client or cancelled sibling says nothing about the provider
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                self.failures += 1
+                retryable = _is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()  # the provider answered, just not favourably
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                deadline = call["deadline"]
+                if attempt >= self.retries or not retryable or deadline is None or loop.time() + delay >= deadline:
+                    raise
+                attempt += 1
+                self.retried += 1
+                await asyncio.sleep(delay)
+                continue
+            
+            self.breaker.record_success()
+            if hedgeable:
+                self._latencies.setdefault(key, deque(maxlen=200)).append(latency)
+            return result
+    
+    async def _request(self, make_call, call: Dict, admitted: Optional[asyncio.Event] = None):
+        """One provider request in its own slot: (result, seconds since admission)"""
+        loop = asyncio.get_running_loop()
+        release = await call["admit"]()
+        try:
+            if admitted is not None:
+                admitted.set()
+            if call["deadline"] is None:
+                call["deadline"] = loop.time() + call["timeout"]
+            started = loop.time()
+            result = await asyncio.wait_for(make_call(), call["deadline"] - started)
+        except BaseException:
+            release()
+            raise
+        if call["hold"]:
+            return (result, release), loop.time() - started
+        release()
+        return result, loop.time() - started
+    
+    async def _attempt(self, make_call, key, call: Dict):
+        threshold = self.p95(key) if self.hedge and key is not None else None
+        admitted = asyncio.Event()
+        tasks = [asyncio.ensure_future(self._request(make_call, call, admitted))]
+        try:
+            if threshold is None:
+                return await tasks[0]
+            
+            # The hedge clock starts once the first request holds a slot
+            waiter = asyncio.ensure_future(admitted.wait())
+            try:
+                await asyncio.wait([tasks[0], waiter], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if not done:
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(self._request(make_call, call)))
+            
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    def stats(self) -> Dict:
+        return {
+            "circuit": self.breaker.state,
+            "circuit_rejections": self.breaker.rejections,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retried,
+            "hedged": self.hedged
+        }
+
+# cached_tokens: prompt tokens the provider served from its prompt-prefix cache
+Completion = namedtuple("Completion", "text prompt_tokens completion_tokens cached_tokens", defaults=(None,))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) for providers that report none"""
+    return max(len(text) // 4, 1) if text else 0
+
+class LLMBackend:
+    """Chat-completion provider behind llm_complete/llm_stream"""
+    name = "base"
+    
+    async def complete(self, messages: List[Dict], temperature: float, max_tokens: int, timeout: float, **options) -> Completion:
+        """One completion; token counts are None when the provider does not report usage"""
+        raise NotImplementedError
+    
+    async def open_stream(self, messages: List[Dict], temperature: float, max_tokens: int, timeout: float):
+        """Start a streaming completion and return an async iterator of text deltas"""
+        raise NotImplementedError
+
+class GroqBackend(LLMBackend):
+    name = "groq"
+    
+    def __init__(self, api_key: Optional[str], model: str):
+        from groq import AsyncGroq
+        # Retries are handled by ResilientCaller, not by the SDK
+        self.client = AsyncGroq(api_key=api_key, max_retries=0)
+        self.model = model
+    
+    async def complete(self, messages, temperature, max_tokens, timeout, **options) -> Completion:
+        completion = await self.client.chat.completions.create(
+            messages=messages,
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            **options
+        )
+        usage = completion.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        return Completion(
+            completion.choices[0].message.content,
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+            getattr(details, "cached_tokens", None)
+        )
+    
+    async def open_stream(self, messages, temperature, max_tokens, timeout):
+        stream = await self.client.chat.completions.create(
+            messages=messages,
+            model=self.model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            stream=True
+        )
+        return self._deltas(stream)
+    
+    @staticmethod
+    async def _deltas(stream):
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+class LLMHTTPError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"LLM server returned {status_code}: {message[:200]}")
+        self.status_code = status_code
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Any server speaking the OpenAI /chat/completions API (vLLM, llama.cpp, Ollama, ...)"""
+    name = "openai"
+    
+    def __init__(self, base_url: str, api_key: Optional[str], model: str):
+        try:
+            import httpx
+        except ImportError:
+            raise RuntimeError("LLM_BACKEND=openai needs the 'httpx' package (pip install httpx)")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.AsyncClient(base_url=base_url.rstrip('/'), headers=headers)
+        self.model = model
+    
+    def _body(self, messages, temperature, max_tokens, **options) -> Dict:
+        return {"model": self.model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, **options}
+    
+    async def complete(self, messages, temperature, max_tokens, timeout, **options) -> Completion:
+        response = await self.client.post(
+            "/chat/completions", json=self._body(messages, temperature, max_tokens, **options), timeout=timeout
+        )
+        if response.status_code >= 400:
+            raise LLMHTTPError(response.status_code, response.text)
+        data = response.json()
+        usage = data.get("usage") or {}
+        return Completion(
+            data["choices"][0]["message"]["content"],
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+            (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        )
+    
+    async def open_stream(self, messages, temperature, max_tokens, timeout):
+        request = self.client.build_request(
+            "POST", "/chat/completions",
+            json=self._body(messages, temperature, max_tokens, stream=True), timeout=timeout
+        )
+        response = await self.client.send(request, stream=True)
+        if response.status_code >= 400:
+            body = await response.aread()
+            await response.aclose()
+            raise LLMHTTPError(response.status_code, body.decode(errors="replace"))
+        return self._deltas(response)
+    
+    @staticmethod
+    async def _deltas(response):
+        """Parse the server-sent events of a streaming completion"""
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json_loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            await response.aclose()
+
+class MockLLMError(Exception):
+    status_code = 503
+
+class MockBackend(LLMBackend):
+    """Deterministic offline backend: replays recorded completions at a configurable
+    time-to-first-token and token rate, so the whole app can be load-tested without
+    API quota or network.
+    
+    Recordings are JSONL lines of {"kind": "chat" | "json" | "text", "completion": str}.
+    JSON-mode calls get "json" recordings, short completions (under 500 tokens) "chat"
+    and the rest "text"; within a kind the recording is picked by a hash of the prompt.
+    Usage is estimated, and a system prompt seen recently counts as cached, the way a
+    provider's prompt-prefix cache would serve it.
+    """
+    name = "mock"
+    
+    def __init__(self, recordings_path: str, latency: float, token_rate: float, error_rate: float = 0.0, seed: int = 0):
+        self.recordings = {}
+        with open(recordings_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json_loads(line)
+                    self.recordings.setdefault(record["kind"], []).append(record["completion"])
+        self.latency = latency
+        self.token_rate = token_rate
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._prefixes = OrderedDict()  # digests of recent system prompts
+    
+    def _usage(self, messages: List[Dict]):
+        """(prompt tokens, cached prompt tokens) for a call"""
+        prompt = sum(estimate_tokens(m["content"]) + 4 for m in messages)
+        if not messages or messages[0]["role"] != "system":
+            return prompt, 0
+        system = messages[0]["content"]
+        digest = hashlib.sha1(system.encode()).digest()
+        if digest in self._prefixes:
+            self._prefixes.move_to_end(digest)
+            return prompt, estimate_tokens(system)
+        self._prefixes[digest] = True
+        if len(self._prefixes) > 256:
+            self._prefixes.popitem(last=False)
+        return prompt, 0
+    
+    def _pick(self, messages: List[Dict], max_tokens: int, options: Dict) -> str:
+        if (options.get("response_format") or {}).get("type") == "json_object":
+            kind = "json"
+        else:
+            kind = "chat" if max_tokens < 500 else "text"
+        choices = self.recordings.get(kind) or [""]
+        digest = hashlib.sha1(json.dumps(messages, sort_keys=True).encode()).digest()
+        return choices[int.from_bytes(digest[:4], "big") % len(choices)]
+    
+    def _tokens(self, text: str) -> List[str]:
+        return re.findall(r"\S+\s*|\s+", text)
+    
+    async def _first_token(self):
+        await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise MockLLMError("mock backend injected failure")
+    
+    async def complete(self, messages, temperature, max_tokens, timeout, **options) -> Completion:
+        text = self._pick(messages, max_tokens, options)
+        tokens = len(self._tokens(text))
+        prompt_tokens, cached_tokens = self._usage(messages)
+        await self._first_token()
+        if self.token_rate > 0:
+            await asyncio.sleep(tokens / self.token_rate)
+        return Completion(text, prompt_tokens, tokens, cached_tokens)
+    
+    async def open_stream(self, messages, temperature, max_tokens, timeout):
+        text = self._pick(messages, max_tokens, {})
+        await self._first_token()
+        return self._deltas(self._tokens(text))
+    
+    async def _deltas(self, tokens: List[str]):
+        for token in tokens:
+            if self.token_rate > 0:
+                await asyncio.sleep(1 / self.token_rate)
+            yield token
+
+class RecordingBackend(LLMBackend):
+    """Wraps a real backend and appends each completion to a JSONL file MockBackend can replay"""
+    def __init__(self, inner: LLMBackend, path: str):
+        self.inner = inner
+        self.name = inner.name
+        self.path = path
+        self._lock = threading.Lock()
+    
+    def _record(self, kind: str, completion: str):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"kind": kind, "completion": completion}) + "\n")
+    
+    async def complete(self, messages, temperature, max_tokens, timeout, **options) -> Completion:
+        completion = await self.inner.complete(messages, temperature, max_tokens, timeout, **options)
+        if (options.get("response_format") or {}).get("type") == "json_object":
+            kind = "json"
+        else:
+            kind = "chat" if max_tokens < 500 else "text"
+        await asyncio.to_thread(self._record, kind, completion.text)
+        return completion
+    
+    async def open_stream(self, messages, temperature, max_tokens, timeout):
+        deltas = await self.inner.open_stream(messages, temperature, max_tokens, timeout)
+        
+        async def recorded():
+            parts = []
+            async for delta in deltas:
+                parts.append(delta)
+                yield delta
+            await asyncio.to_thread(self._record, "chat" if max_tokens < 500 else "text", ''.join(parts))
+        return recorded()
+
+def create_llm_backend() -> LLMBackend:
+    """Pick the completion provider from LLM_BACKEND (groq, openai or mock)"""
+    if LLM_BACKEND == "mock":
+        return MockBackend(LLM_MOCK_RECORDINGS, LLM_MOCK_LATENCY, LLM_MOCK_TOKEN_RATE, LLM_MOCK_ERROR_RATE)
+    if LLM_BACKEND == "openai":
+        backend = OpenAICompatibleBackend(LLM_BASE_URL, os.getenv("API_KEY"), LLM_MODEL)
+    else:
+        backend = GroqBackend(os.getenv("API_KEY"), LLM_MODEL)
+    if LLM_RECORD_PATH:
+        return RecordingBackend(backend, LLM_RECORD_PATH)
+    return backend
+
+llm_backend = create_llm_backend()
+
+llm_caller = ResilientCaller(
+    LLM_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX,
+    CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN),
+    hedge=LLM_HEDGE, hedge_min_samples=LLM_HEDGE_MIN_SAMPLES
+)
+
+def _call_outcome(error: Exception) -> str:
+    if isinstance(error, LLMBusy):
+        return "busy"
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return "error"
+
+def _count_tokens(operation: str, messages: List[Dict], completion: Completion):
+    prompt = completion.prompt_tokens or estimate_tokens(''.join(m["content"] for m in messages))
+    generated = completion.completion_tokens or estimate_tokens(completion.text)
+    cached = completion.cached_tokens or 0
+    llm_tokens.inc(prompt, operation=operation, kind="prompt")
+    llm_tokens.inc(generated, operation=operation, kind="completion")
+    if cached:
+        llm_tokens.inc(cached, operation=operation, kind="cached")
+    if LLM_LOG_TOKENS:
+        print(f"LLM {operation}: {prompt} prompt tokens ({cached} cached), {generated} completion tokens")
+
+async def llm_complete(messages: List[Dict], temperature: float, max_tokens: int, timeout: float,
+                       priority: int = PRIORITY_ANALYSIS, **options) -> str:
+    """Run one completion on the async backend so the event loop keeps serving other requests"""
+    operation = "chat" if priority == PRIORITY_CHAT else "analysis"
+    try:
+        with stage_latency.time(operation=operation, stage="llm_wait"):
+            completion = await llm_caller.call(
+                lambda: llm_backend.complete(messages, temperature, max_tokens, timeout, **options),
+                timeout,
+                key=max_tokens,
+                admit=lambda: llm_scheduler.admit(priority)
+            )
+    except Exception as e:
+        llm_calls.inc(operation=operation, outcome=_call_outcome(e))
+        raise
+    llm_calls.inc(operation=operation, outcome="ok")
+    _count_tokens(operation, messages, completion)
+    return completion.text
+
+async def llm_stream(messages: List[Dict], temperature: float, max_tokens: int, timeout: float,
+                     priority: int = PRIORITY_ANALYSIS):
+    """Yield completion text deltas as the provider streams them"""
+    operation = "chat" if priority == PRIORITY_CHAT else "analysis"
+    parts = []
+    try:
+        with stage_latency.time(operation=operation, stage="llm_wait"):
+            # Opening the stream is retried; once tokens flow a failure is reported to the
+            # caller, and the request keeps its scheduler slot until the stream ends
+            deltas, release = await llm_caller.call(
+                lambda: llm_backend.open_stream(messages, temperature, max_tokens, timeout),
+                timeout,
+                hedgeable=False,
+                admit=lambda: llm_scheduler.admit(priority),
+                hold=True
+            )
+            try:
+                async for delta in deltas:
+                    parts.append(delta)
+                    yield delta
+            except Exception:
+                llm_caller.breaker.record_failure()
+                raise
+            finally:
+                release()
+    except Exception as e:
+        llm_calls.inc(operation=operation, outcome=_call_outcome(e))
+        raise
+    llm_calls.inc(operation=operation, outcome="ok")
+    _count_tokens(operation, messages, Completion(''.join(parts), None, None))
+
+@asynccontextmanager
+async def lifespan(app):
+    if loop_monitor:
+        loop_monitor.start()
+    yield
+    if loop_monitor:
+        loop_monitor.stop()
+
+app = FastAPI(title="AI Career Guidance System", version="6.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,16 +957,255 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class MetricsMiddleware:
+    """Times every HTTP request by route template; plain ASGI so the cost is two clock reads"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_latency.observe(time.perf_counter() - started, route=route, method=scope["method"], status=status)
+
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(LLMBusy)
+async def llm_busy_handler(request: Request, exc: LLMBusy):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 class QuestionAnswer(BaseModel):
     question_id: str
     answers: List[str]
     session_id: Optional[str] = None
     custom_answer: Optional[str] = None
 
+class BatchAnswers(BaseModel):
+    session_id: Optional[str] = None
+    answers: List[QuestionAnswer]
+
 class ChatMessage(BaseModel):
     session_id: str
     message: str
 
+CHAT_FALLBACK = "I'd suggest focusing on practical projects first. What specific area interests you most?"
+
+# Parser section name -> key in the analysis dict
+ANALYSIS_SECTIONS = {
+    "careers": "career_matches",
+    "skills": "missing_skills",
+    "certs": "certifications",
+    "projects": "projects",
+    "roadmap": "roadmap",
+    "job": "job_search",
+    "advice": "final_advice"
+}
+
+def empty_analysis() -> Dict:
+    return {
+        "career_matches": [],
+        "missing_skills": [],
+        "certifications": [],
+        "projects": [],
+        "roadmap": {},
+        "job_search": {},
+        "final_advice": "",
+        "is_personalized": True
+    }
+
+class CareerMatch(BaseModel):
+    title: str
+    match: int
+    details: List[str] = []
+
+class SkillItem(BaseModel):
+    skill: str
+    details: List[str] = []
+
+class CertificationItem(BaseModel):
+    name: str
+    details: List[str] = []
+
+class ProjectItem(BaseModel):
+    name: str
+    details: List[str] = []
+
+# Analysis key -> (type, what to ask the model for in JSON mode)
+ANALYSIS_SCHEMA = {
+    "career_matches": (
+        List[CareerMatch],
+        '[{"title": str, "match": int 0-100, "details": ["Why it fits: ...", "Entry Requirements: ...", "Salary Range: ...", "Next Steps: ..."]}] - exactly 3'
+    ),
+    "missing_skills": (
+        List[SkillItem],
+        '[{"skill": str, "details": ["Why Critical: ...", "Learning Time: ...", "Best Resources: ..."]}] - 5, priority order'
+    ),
+    "certifications": (
+        List[CertificationItem],
+        '[{"name": str, "details": ["Why Essential: ...", "Platform & Cost: ...", "Duration: ...", "Value: ..."]}] - 4'
+    ),
+    "projects": (
+        List[ProjectItem],
+        '[{"name": str, "details": ["Technologies: ...", "Timeline: ...", "What It Demonstrates: ...", "Where to Showcase: ..."]}] - 4'
+    ),
+    "roadmap": (
+        Dict[str, List[str]],
+        '{"Month 1": [3 specific actions], ..., "Month 6": [3 specific actions]}'
+    ),
+    "job_search": (
+        Dict[str, str],
+        '{"Immediate Steps": str, "Resources": str, "Networking": str, "Application Strategy": str}'
+    ),
+    "final_advice": (
+        str,
+        'str - 3-4 sentences on their specific situation, education level and motivation'
+    )
+}
+
+# Analysis prompts are a constant system message (the instructions) followed by a short
+# user message (the profile and chat), so a provider's prompt-prefix cache can serve
+# the instructions for every user and only the profile is processed per call
+ANALYSIS_TEXT_PROMPT = """You are a career coach. Write a DETAILED career analysis for the user profile in the next message.
+
+FORMAT EXACTLY AS:
+
+🎯 TOP 3 CAREER MATCHES
+For each career (numbered 1-3):
+- Job Title | XX% match
+- Why it fits: [Reference their specific interests/skills/education]
+- Entry Requirements: [What they need]
+- Salary Range: [Realistic for their level]
+- Next Steps: [Specific actions]
+
+💪 MISSING SKILLS (Priority Order)
+For each skill (numbered 1-5):
+- Skill Name
+- Why Critical: [For their target careers]
+- Learning Time: [With their study hours]
+- Best Resources: [2-3 specific courses/platforms]
+
+📜 REQUIRED CERTIFICATIONS
+For each cert (numbered 1-4):
+- Certification Name
+- Why Essential: [Career impact]
+- Platform & Cost
+- Duration
+- Value: [How it helps]
+
+🚀 PORTFOLIO PROJECTS
+For each project (numbered 1-4):
+- Project Name
+- Technologies: [Match their field]
+- Timeline: [Based on study time]
+- What It Demonstrates
+- Where to Showcase
+
+🗺️ 6-MONTH ROADMAP
+Month 1: [Focus area with 3 specific actions]
+Month 2: [Next phase with 3 actions]
+Month 3: [Skill building with 3 actions]
+Month 4: [Project work with 3 actions]
+Month 5: [Portfolio completion with 3 actions]
+Month 6: [Goal achievement with 3 actions]
+
+💼 ACTION PLAN
+- Immediate Steps: [What to do this week]
+- Resources: [Specific platforms/courses]
+- Networking: [Where to connect]
+- Application Strategy: [If job-seeking]
+
+💡 PERSONALIZED ADVICE
+[3-4 sentences addressing their specific situation, education level, and motivational guidance]
+
+Make EVERYTHING specific to THIS user."""
+
+@functools.lru_cache(maxsize=None)
+def analysis_json_prompt(keys: tuple) -> str:
+    """Constant JSON-mode instructions for one set of sections, built once per set"""
+    specs = '\n'.join(f'"{key}": {ANALYSIS_SCHEMA[key][1]}' for key in keys)
+    return f"""You are a career coach. Write a DETAILED career analysis for the user profile in the next message.
+
+Respond with ONE JSON object with exactly these keys:
+{specs}
+
+Make EVERYTHING specific to THIS user."""
+
+# Profile field -> label in the analysis prompt, in prompt order
+PROFILE_LABELS = (
+    ("education_level", "Education"),
+    ("stream", "Stream"),
+    ("field", "Field"),
+    ("interests", "Interests"),
+    ("skills", "Skills"),
+    ("experience", "Experience"),
+    ("goals", "Goals"),
+    ("time_commitment", "Weekly study time"),
+    ("learning_style", "Learning style"),
+    ("budget", "Budget"),
+    ("location", "Location")
+)
+
+# Completion budget when a section is requested on its own
+SECTION_MAX_TOKENS = {
+    "career_matches": 600,
+    "missing_skills": 500,
+    "certifications": 450,
+    "projects": 450,
+    "roadmap": 450,
+    "job_search": 300,
+    "final_advice": 200
+}
+
+# One single-field model per section, so a bad section never invalidates the others
+SECTION_MODELS = {
+    key: create_model(f"{key}_section", **{key: (field_type, ...)})
+    for key, (field_type, _) in ANALYSIS_SCHEMA.items()
+}
+
+def validate_section(key: str, value):
+    """Schema-checked section value, or None if the model got it wrong or left it empty"""
+    model = SECTION_MODELS[key]
+    validate = getattr(model, "model_validate", None) or model.parse_obj
+    try:
+        parsed = validate({key: value})
+    except Exception:
+        return None
+    dump = getattr(parsed, "model_dump", None) or parsed.dict
+    data = dump()[key]
+    if not data:
+        return None
+    if key == "career_matches":
+        for career in data:
+            career["match"] = str(career["match"])
+    return data
+
+# Chat keywords that make an analysis section stale
+SECTION_TOPICS = {
+    "career_matches": ("career", "role", "salary", "field", "switch", "become", "profession"),
+    "missing_skills": ("skill", "learn", "python", "java", "language", "tool", "framework"),
+    "certifications": ("certif", "exam", "credential", "course"),
+    "projects": ("project", "portfolio", "build", "github"),
+    "roadmap": ("month", "plan", "roadmap", "schedule", "hours", "week", "time"),
+    "job_search": ("job", "intern", "resume", "interview", "apply", "network", "linkedin")
+}
+
 # Dynamic Question Tree
 QUESTION_TREE = {
     "start": {
@@ -794,53 +1969,949 @@ QUESTION_TREE = {
     }
 }
 
-class CareerAgent:
-    def __init__(self):
-        self.name = "Career Coach Alex"
-        self.chat_histories = {}
+def _profile_field_for(question_id: str):
+    """Which profile field a question's answer fills, and how (first, extend or replace)"""
+    if question_id == "start":
+        return ("education_level", "first")
+    elif "stream" in question_id:
+        return ("stream", "first")
+    elif "field" in question_id or "branch" in question_id:
+        return ("field", "first")
+    elif "interest" in question_id:
+        return ("interests", "extend")
+    elif "skill" in question_id:
+        return ("skills", "extend")
+    elif "experience" in question_id:
+        return ("experience", "first")
+    elif "goal" in question_id:
+        return ("goals", "extend")
+    elif question_id == "study_time":
+        return ("time_commitment", "first")
+    elif question_id == "learning_style":
+        return ("learning_style", "replace")
+    elif question_id == "budget":
+        return ("budget", "first")
+    elif question_id == "location_preference":
+        return ("location", "first")
+    return None
+
+class CompiledQuestionTree:
+    """QUESTION_TREE compiled once at startup into constant-time routing tables.
     
-    def get_next_question(self, current_q_id: str, answer: List[str]) -> Optional[str]:
-        """Determine next question based on current answer"""
-        if current_q_id not in QUESTION_TREE:
-            return None
-        
-        current_q = QUESTION_TREE[current_q_id]
-        logic = current_q.get("next_question_logic", {})
-        
-        if not logic:
-            return None
+    Targets that point at missing questions end the questionnaire, exactly as
+    the old per-request lookup did; they are collected in `dangling` so they
+    can be reported. A cycle in the tree is a hard error.
+    """
+    def __init__(self, tree: Dict):
+        self.questions = tree
+        self.transitions = {}     # question_id -> {option: next_id or None}
+        self.defaults = {}        # question_id -> next_id or None
+        self.profile_fields = {}  # question_id -> (field, mode) or None
+        self.dangling = []        # (question_id, option, missing_target)
         
-        # Check if answer matches specific logic
-        for ans in answer:
-            if ans in logic:
-                next_q_id = logic[ans]
-                return next_q_id if next_q_id != "end" else None
+        if "start" not in tree:
+            raise ValueError("QUESTION_TREE has no 'start' question")
         
-        # Use default if exists
-        if "default" in logic:
-            next_q_id = logic["default"]
-            return next_q_id if next_q_id != "end" else None
+        for q_id, question in tree.items():
+            table = {}
+            for option, target in question.get("next_question_logic", {}).items():
+                if target == "end":
+                    target = None
+                elif target not in tree:
+                    self.dangling.append((q_id, option, target))
+                    target = None
+                table[option] = target
+            self.defaults[q_id] = table.pop("default", None)
+            self.transitions[q_id] = table
+            self.profile_fields[q_id] = _profile_field_for(q_id)
         
-        return None
+        self._check_cycles()
     
-    async def chat(self, sid: str, msg: str, profile: Dict) -> Dict:
-        """Short, clear, relevant chat responses"""
-        if sid not in self.chat_histories:
-            self.chat_histories[sid] = []
-        
-        self.chat_histories[sid].append({"role": "user", "content": msg})
-        
-        # Build concise profile context
-        profile_parts = []
-        if profile.get('education'):
-            profile_parts.append(f"Education: {profile['education']}")
-        if profile.get('interests'):
-            profile_parts.append(f"Interests: {', '.join(profile['interests'][:2])}")
-        if profile.get('skills'):
-            profile_parts.append(f"Skills: {', '.join(profile['skills'][:3])}")
-        if profile.get('goals'):
-            profile_parts.append(f"Goals: {', '.join(profile['goals'][:2])}")
-        
+    def _check_cycles(self):
+        # Iterative DFS with white/grey/black colouring
+        state = {}
+        for root in self.questions:
+            if root in state:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self._successors(root)))]
+            while stack:
+                q_id, successors = stack[-1]
+                child = next(successors, None)
+                if child is None:
+                    state[q_id] = 2
+                    stack.pop()
+                elif state.get(child) == 1:
+                    raise ValueError(f"QUESTION_TREE has a cycle through '{child}'")
+                elif child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(self._successors(child))))
+    
+    def _successors(self, q_id: str) -> List[str]:
+        targets = set(self.transitions[q_id].values())
+        targets.add(self.defaults[q_id])
+        targets.discard(None)
+        return sorted(targets)
+    
+    def next_question(self, q_id: str, answers: List[str]) -> Optional[str]:
+        """Next question id for the selected options, or None when the path ends"""
+        table = self.transitions.get(q_id)
+        if table is None:
+            return None
+        for answer in answers:
+            if answer in table:
+                return table[answer]
+        return self.defaults[q_id]
+    
+    def apply_answer(self, profile: Dict, q_id: str, answers: List[str]):
+        """Update the profile field this question feeds"""
+        mapping = self.profile_fields.get(q_id)
+        if not mapping or not answers:
+            return
+        field, mode = mapping
+        if mode == "first":
+            profile[field] = answers[0]
+        elif mode == "extend":
+            profile.setdefault(field, []).extend(answers)
+        else:
+            profile[field] = list(answers)
+
+def build_questionnaire_bundle(routes: CompiledQuestionTree) -> Dict:
+    """Serialize the compiled tree once, with an ETag and pre-compressed bodies"""
+    payload = {
+        "start": "start",
+        "questions": routes.questions,
+        "transitions": routes.transitions,
+        "defaults": routes.defaults
+    }
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    encodings = {"identity": body, "gzip": gzip.compress(body, compresslevel=9)}
+    try:
+        import brotli
+        encodings["br"] = brotli.compress(body)
+    except ImportError:
+        pass
+    return {"etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"', "encodings": encodings}
+
+QUESTION_ROUTES = CompiledQuestionTree(QUESTION_TREE)
+QUESTIONNAIRE_BUNDLE = build_questionnaire_bundle(QUESTION_ROUTES)
+if QUESTION_ROUTES.dangling:
+    missing = sorted({target for _, _, target in QUESTION_ROUTES.dangling})
+    print(f"Question tree: {len(missing)} missing follow-up questions end their paths early: {', '.join(missing)}")
+
+# Template analyses: per-track content and, per question, which career each option points to
+TEMPLATE_TRACKS = {
+    "software": {
+        "entry": "A B.Tech/BCA/B.Sc CS, or a strong GitHub portfolio for skill-based hiring",
+        "salary": "₹4-8 LPA for freshers, ₹15-30 LPA with 4+ years",
+        "next": "Build two deployed projects and solve 100 DSA problems",
+        "skills": [
+            ("Data Structures & Algorithms", "Every product-company interview tests it", "3-4 months", "NeetCode, LeetCode, GeeksforGeeks"),
+            ("Git/GitHub", "Recruiters read your commit history as a portfolio", "1-2 weeks", "Pro Git book, GitHub Skills"),
+            ("Web Frameworks (React/Node.js/Django)", "Most fresher openings are web roles", "2-3 months", "The Odin Project, official docs"),
+            ("SQL/Databases", "Nearly every application stores and queries data", "3-4 weeks", "SQLBolt, Mode SQL tutorial"),
+            ("Cloud Platforms (AWS/Azure)", "Deployment skills separate you from other freshers", "1-2 months", "AWS Skill Builder, freeCodeCamp"),
+        ],
+        "certs": [
+            ("AWS Certified Cloud Practitioner", "Proves you can deploy what you build", "AWS, $100", "4-6 weeks"),
+            ("Meta Back-End Developer Certificate", "Structured path through APIs and databases", "Coursera, ~$49/month", "6-8 months"),
+            ("Google IT Automation with Python", "Covers Python, Git and automation basics", "Coursera, ~$49/month", "6 months"),
+            ("Oracle Java SE Programmer", "Valued by service companies and banks", "Oracle, ~$245", "2-3 months"),
+        ],
+        "projects": [
+            ("Full-Stack Task Manager", "React, Node.js, PostgreSQL", "3-4 weeks", "CRUD, auth and deployment end to end"),
+            ("Realtime Chat App", "WebSockets, Redis, Docker", "3 weeks", "Concurrency and realtime systems"),
+            ("Open Source Contribution", "Git, the project's own stack", "Ongoing", "Working in a real codebase with reviews"),
+            ("REST API with Tests", "FastAPI or Spring Boot, pytest/JUnit", "2 weeks", "Clean API design and testing discipline"),
+        ],
+        "roadmap": [
+            ("Pick one language and finish its fundamentals", "Set up Git and push daily", "Solve 20 easy DSA problems"),
+            ("Learn HTML, CSS and one web framework", "Build a small personal site", "Continue DSA: arrays, strings, hashing"),
+            ("Add a database and authentication", "Start the full-stack project", "Join a developer community"),
+            ("Deploy to the cloud", "Write tests for your API", "Contribute one open-source fix"),
+            ("Polish two portfolio projects", "Mock interviews twice a week", "Prepare resume and LinkedIn"),
+            ("Apply to 15+ roles per week", "Attend hackathons and meetups", "Keep solving medium DSA problems"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Pin your two best projects on GitHub and link them from your resume",
+            "Resources": "LinkedIn Jobs, Naukri, Wellfound, Instahyre and company career pages",
+            "Networking": "Join local developer meetups and ask alumni for referrals",
+            "Application Strategy": "Target product startups and service companies in parallel; referrals first",
+        },
+    },
+    "data": {
+        "entry": "A degree with maths/statistics, or a portfolio of analysis projects",
+        "salary": "₹4-7 LPA for freshers, ₹12-25 LPA with 3+ years",
+        "next": "Publish three analysis notebooks on GitHub or Kaggle",
+        "skills": [
+            ("SQL/Databases", "The first filter in almost every analyst interview", "4-6 weeks", "SQLBolt, Mode SQL tutorial, LeetCode SQL"),
+            ("Python", "Pandas and NumPy are the daily tools of the job", "2 months", "Kaggle Learn, Python for Data Analysis"),
+            ("Statistics", "Needed to draw conclusions that hold up", "2 months", "Khan Academy, StatQuest"),
+            ("Power BI/Tableau", "Dashboards are how analysts share results", "3-4 weeks", "Microsoft Learn, Tableau Public"),
+            ("Machine Learning basics", "Opens the path from analyst to data scientist", "2-3 months", "Andrew Ng's ML course, scikit-learn docs"),
+        ],
+        "certs": [
+            ("Google Data Analytics Certificate", "Widely recognised entry-level credential", "Coursera, ~$49/month", "4-6 months"),
+            ("Microsoft Power BI Data Analyst (PL-300)", "Standard for BI roles", "Microsoft, ~$165", "6-8 weeks"),
+            ("IBM Data Science Professional Certificate", "Covers Python, SQL and ML basics", "Coursera, ~$49/month", "5-6 months"),
+            ("Tableau Desktop Specialist", "Quick proof of dashboard skills", "Tableau, $100", "3-4 weeks"),
+        ],
+        "projects": [
+            ("Sales Dashboard", "SQL, Power BI/Tableau", "2-3 weeks", "Turning raw data into business insight"),
+            ("Exploratory Analysis Notebook", "Python, Pandas, Matplotlib", "2 weeks", "Cleaning and exploring a real dataset"),
+            ("Prediction Model", "scikit-learn, Jupyter", "3-4 weeks", "Framing and evaluating an ML problem"),
+            ("Kaggle Competition Entry", "Python, feature engineering", "4 weeks", "Benchmarking against other practitioners"),
+        ],
+        "roadmap": [
+            ("Learn SQL basics", "Refresh statistics fundamentals", "Set up Python and Jupyter"),
+            ("Pandas data cleaning practice", "Solve 30 SQL problems", "Start the exploratory analysis project"),
+            ("Learn Power BI or Tableau", "Build the sales dashboard", "Post insights on LinkedIn"),
+            ("Machine learning basics", "Start the prediction model", "Join a Kaggle competition"),
+            ("Polish portfolio and resume", "Practise case-study interviews", "Network with analysts"),
+            ("Apply to analyst roles", "Prepare SQL and statistics interview questions", "Keep publishing analyses"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Publish your best analysis with a clear write-up and link it on your resume",
+            "Resources": "LinkedIn Jobs, Naukri, AnalyticsVidhya jobs and Kaggle",
+            "Networking": "Share analyses on LinkedIn and join data community meetups",
+            "Application Strategy": "Start with analyst and BI roles; move towards data science after a year",
+        },
+    },
+    "engineering": {
+        "entry": "A B.Tech/B.E. in the branch; GATE for PSUs and M.Tech",
+        "salary": "₹3.5-7 LPA for freshers, ₹10-20 LPA with 5+ years",
+        "next": "Do an industrial internship and learn the branch's core design software",
+        "skills": [
+            ("CAD/Simulation Software", "Design work happens in AutoCAD, SolidWorks or ANSYS", "2-3 months", "Autodesk and Dassault tutorials, NPTEL"),
+            ("Core Subject Fundamentals", "Interviews and GATE test core concepts", "Ongoing", "NPTEL lectures, standard textbooks"),
+            ("MS Excel & Data Analysis", "Used daily for calculations and reports", "3-4 weeks", "Microsoft Learn, ExcelJet"),
+            ("Python", "Automation and analysis are expected in modern plants", "1-2 months", "Automate the Boring Stuff, NPTEL"),
+            ("Technical Communication", "Reports and drawings must be clear to others", "Ongoing", "Technical writing courses on Coursera"),
+        ],
+        "certs": [
+            ("Autodesk Certified Professional (AutoCAD)", "Standard design tool credential", "Autodesk, ~$200", "2 months"),
+            ("CSWA (SolidWorks Associate)", "Proves 3D modelling skill", "Dassault, ~$99", "1-2 months"),
+            ("NPTEL Elite Certificate in a core subject", "Recognised by Indian employers and for GATE prep", "NPTEL, ~₹1,000", "12 weeks"),
+            ("Six Sigma Yellow/Green Belt", "Valued in manufacturing and operations", "Various providers", "1-2 months"),
+        ],
+        "projects": [
+            ("Design and Simulate a Component", "SolidWorks/ANSYS", "4 weeks", "Design-to-analysis workflow"),
+            ("IoT Monitoring Prototype", "Arduino/ESP32, sensors", "3-4 weeks", "Hands-on hardware and data"),
+            ("Plant Process Optimisation Study", "Excel, Python", "3 weeks", "Applying theory to a real process"),
+            ("Final-Year Project with Industry Mentor", "Branch-specific tools", "3-6 months", "Depth in one problem"),
+        ],
+        "roadmap": [
+            ("Revise core subjects", "Start CAD software basics", "List target companies and PSUs"),
+            ("Finish one CAD/simulation course", "Begin the design project", "Start GATE or placement prep"),
+            ("Apply for an industrial internship", "Learn Python for engineering", "Attend a technical workshop"),
+            ("Complete the design project", "Take an NPTEL certification exam", "Connect with engineers on LinkedIn"),
+            ("Build a project portfolio", "Mock technical interviews", "Prepare resume"),
+            ("Apply to core companies and PSUs", "Continue GATE preparation", "Follow up on internship contacts"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Shortlist core companies and PSUs hiring in your branch",
+            "Resources": "Naukri, LinkedIn, PSU recruitment portals and campus placement cells",
+            "Networking": "Join your branch's professional society (SAE, ASME, IEEE) and attend its events",
+            "Application Strategy": "Combine campus placements, GATE scores for PSUs and direct applications",
+        },
+    },
+    "medical": {
+        "entry": "NEET-UG for MBBS/BDS/AYUSH; college-level entrance or merit for allied courses",
+        "salary": "₹3-6 LPA at entry for allied roles; ₹8-15 LPA for doctors after internship",
+        "next": "Plan entrance exam preparation and shadow a practitioner",
+        "skills": [
+            ("Biology & Chemistry Fundamentals", "The base of every entrance exam and course", "Ongoing", "NCERT textbooks, NEET prep material"),
+            ("Patient Communication", "Care quality depends on explaining clearly", "Ongoing", "Volunteering, communication workshops"),
+            ("Medical Terminology", "Needed to read records and literature", "4-6 weeks", "Coursera medical terminology courses"),
+            ("First Aid & Basic Life Support", "Expected of every healthcare worker", "1-2 days", "Red Cross, St John Ambulance"),
+            ("Time Management", "Long study and shift hours need a routine", "Ongoing", "Weekly planning, Pomodoro technique"),
+        ],
+        "certs": [
+            ("Basic Life Support (BLS)", "Required in hospitals and clinics", "AHA/Red Cross, ~₹2,000", "1 day"),
+            ("First Aid Certification", "Useful from day one of training", "St John Ambulance, ~₹1,000", "1-2 days"),
+            ("Clinical Research Fundamentals", "Opens clinical research roles", "Coursera/ICRI", "1-3 months"),
+            ("Healthcare Quality Management", "Valued for hospital administration", "NABH/online", "2-3 months"),
+        ],
+        "projects": [
+            ("Community Health Awareness Drive", "Surveys, posters, local clinics", "2-3 weeks", "Public health communication"),
+            ("Hospital Volunteering Log", "Reflective journal", "Ongoing", "Exposure to real clinical settings"),
+            ("Literature Review on a Health Topic", "PubMed, Google Scholar", "3-4 weeks", "Reading and summarising research"),
+            ("Health Data Mini-Study", "Excel, basic statistics", "3 weeks", "Evidence-based thinking"),
+        ],
+        "roadmap": [
+            ("Build a daily study timetable", "Finish NCERT biology revision", "Take a diagnostic mock test"),
+            ("Cover high-weightage chapters", "Weekly mock tests", "Start a mistakes notebook"),
+            ("Volunteer at a clinic or hospital", "Complete a first aid course", "Revise chemistry"),
+            ("Full-length mocks every week", "Analyse weak topics", "Research colleges and cut-offs"),
+            ("Intensive revision", "Practise previous years' papers", "Prepare documents for counselling"),
+            ("Appear for exams and counselling", "Keep an allied-course backup ready", "Plan the first year of the course"),
+        ],
+        "job_search": {
+            "Immediate Steps": "List entrance exams, dates and eligibility for your chosen course",
+            "Resources": "NTA NEET portal, MCC counselling, state counselling sites",
+            "Networking": "Talk to current students and practitioners about their path",
+            "Application Strategy": "Apply to several exams and keep allied health courses as a backup",
+        },
+    },
+    "commerce": {
+        "entry": "B.Com/BBA, or professional course registration (CA/CS/CMA)",
+        "salary": "₹3-6 LPA for freshers, ₹8-20 LPA for qualified professionals",
+        "next": "Register for your professional course or an accounting internship",
+        "skills": [
+            ("Accounting & Bookkeeping", "The base of every commerce role", "2 months", "ICAI study material, Tally training"),
+            ("MS Excel & Data Analysis", "Finance teams live in spreadsheets", "4-6 weeks", "ExcelJet, Microsoft Learn"),
+            ("Taxation", "GST and income tax work is in constant demand", "2-3 months", "ICAI material, ClearTax guides"),
+            ("Financial Analysis", "Needed for banking, investment and FP&A roles", "2 months", "CFI free courses, Investopedia"),
+            ("Business Communication", "Client and team reporting depends on it", "Ongoing", "Toastmasters, business writing courses"),
+        ],
+        "certs": [
+            ("Tally Prime Certification", "Standard for accounting jobs in India", "Tally Education, ~₹5,000", "1-2 months"),
+            ("NISM Series (Equity/Mutual Funds)", "Required for many securities roles", "NISM, ~₹1,500", "3-4 weeks"),
+            ("Financial Modeling & Valuation Analyst", "Signals analyst-ready skills", "CFI, ~$500", "3-4 months"),
+            ("GST Practitioner Course", "Direct route to taxation work", "Various providers", "1-2 months"),
+        ],
+        "projects": [
+            ("Company Financial Statement Analysis", "Excel, annual reports", "2-3 weeks", "Reading and interpreting financials"),
+            ("Personal Investment Portfolio Tracker", "Excel/Google Sheets", "2 weeks", "Returns, risk and diversification"),
+            ("Small Business Bookkeeping", "Tally Prime", "1 month", "Real-world accounting practice"),
+            ("Market Research Report", "Surveys, Excel", "3 weeks", "Business analysis and presentation"),
+        ],
+        "roadmap": [
+            ("Revise accounting fundamentals", "Learn Excel formulas and pivots", "Register for your professional course"),
+            ("Start Tally or bookkeeping practice", "Read one annual report", "Follow financial news daily"),
+            ("Complete the financial analysis project", "Study GST basics", "Join a finance club or community"),
+            ("Take an NISM or Tally certification", "Apply for an articleship or internship", "Build a LinkedIn profile"),
+            ("Work on the market research project", "Practise interview case questions", "Network with finance professionals"),
+            ("Apply to firms and banks", "Prepare for your next course exam", "Keep tracking markets"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Update your resume with certifications and internship work",
+            "Resources": "Naukri, LinkedIn, ICAI/ICSI job portals and bank recruitment sites",
+            "Networking": "Connect with CAs and finance professionals; attend ICAI/ICSI events",
+            "Application Strategy": "Target audit firms, banks and finance teams of mid-size companies",
+        },
+    },
+    "arts": {
+        "entry": "A B.A. in the subject; postgraduate study for research, counselling or teaching",
+        "salary": "₹2.5-5 LPA at entry, ₹6-15 LPA with specialisation and experience",
+        "next": "Start a writing or research portfolio and find a relevant internship",
+        "skills": [
+            ("Writing & Communication", "Every humanities career runs on clear writing", "Ongoing", "Coursera writing courses, daily journaling"),
+            ("Research & Analysis", "Turns opinions into evidence-backed work", "2 months", "Google Scholar, research methods courses"),
+            ("Public Speaking", "Teaching, media and advocacy depend on it", "Ongoing", "Toastmasters, college debates"),
+            ("Digital Literacy", "Content and research work is online", "3-4 weeks", "Google Digital Garage"),
+            ("Languages (English, Hindi, others)", "Widens jobs in media, translation and teaching", "Ongoing", "Duolingo, British Council"),
+        ],
+        "certs": [
+            ("Google Digital Marketing & E-commerce", "Adds an employable digital skill", "Coursera, ~$49/month", "6 months"),
+            ("Psychological First Aid", "Useful for counselling and social work", "Coursera (Johns Hopkins), free to audit", "6 hours"),
+            ("Teaching English (TEFL/TESOL)", "Opens teaching work in India and abroad", "Various providers", "2-3 months"),
+            ("UGC-NET (for lecturer roles)", "Required for college teaching", "NTA", "6-12 months of preparation"),
+        ],
+        "projects": [
+            ("Research Blog or Newsletter", "Substack/Medium", "Ongoing", "Consistent writing and analysis"),
+            ("Community Survey Study", "Google Forms, Excel", "3-4 weeks", "Designing and analysing research"),
+            ("Podcast or Video Series", "Audacity, smartphone video", "4 weeks", "Communication and storytelling"),
+            ("NGO Volunteering Project", "Field work, reports", "1-2 months", "Real social impact"),
+        ],
+        "roadmap": [
+            ("Choose a specialisation to explore", "Read two foundational books", "Start a writing habit"),
+            ("Begin a blog or newsletter", "Take a research methods course", "Join a debate or literary club"),
+            ("Volunteer with an NGO or institution", "Start the survey study", "Improve a second language"),
+            ("Publish your research findings", "Take a digital skills certification", "Network with professionals"),
+            ("Apply for internships", "Prepare for postgraduate entrance exams", "Build an online portfolio"),
+            ("Apply for jobs or postgraduate study", "Keep publishing", "Seek a mentor in the field"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Collect your best writing and research in one online portfolio",
+            "Resources": "LinkedIn, Internshala, DevNetJobs (NGOs) and university job boards",
+            "Networking": "Attend seminars and literary events; connect with alumni",
+            "Application Strategy": "Combine internships with postgraduate applications",
+        },
+    },
+    "creative": {
+        "entry": "A design degree (NID/NIFT/private) or a strong portfolio",
+        "salary": "₹3-6 LPA at entry, ₹10-20 LPA for senior designers",
+        "next": "Build a portfolio of 5-6 polished pieces",
+        "skills": [
+            ("Figma/Adobe XD", "The standard tools for UI and product design", "1-2 months", "Figma tutorials, DesignCourse on YouTube"),
+            ("Adobe Photoshop", "Used in nearly every visual role", "1-2 months", "Adobe tutorials, Skillshare"),
+            ("Adobe Illustrator", "Vector work for branding and illustration", "1-2 months", "Adobe tutorials, Skillshare"),
+            ("Design Principles", "Layout, typography and colour separate amateurs from pros", "2 months", "The Non-Designer's Design Book, Refactoring UI"),
+            ("Portfolio Presentation", "Clients hire from case studies", "Ongoing", "Behance, Dribbble case studies"),
+        ],
+        "certs": [
+            ("Google UX Design Certificate", "Recognised entry into UX", "Coursera, ~$49/month", "6 months"),
+            ("Adobe Certified Professional", "Proves tool fluency", "Adobe, ~$80", "1-2 months"),
+            ("Interaction Design Foundation courses", "Deep UX theory", "IxDF, ~$200/year", "Self-paced"),
+            ("Canva Design School", "Quick social media design skills", "Canva, free", "2-3 weeks"),
+        ],
+        "projects": [
+            ("Brand Identity for a Local Business", "Illustrator, Photoshop", "3 weeks", "Real client work"),
+            ("App Redesign Case Study", "Figma", "3-4 weeks", "UX research and iteration"),
+            ("Personal Portfolio Website", "Webflow/Framer", "2 weeks", "Presenting your work professionally"),
+            ("30-Day Design Challenge", "Your main tool", "1 month", "Consistency and range"),
+        ],
+        "roadmap": [
+            ("Learn design fundamentals", "Pick one primary tool", "Follow designers you admire"),
+            ("Daily practice pieces", "Start the 30-day challenge", "Join Behance/Dribbble"),
+            ("Brand identity project", "Get feedback from a design community", "Learn a second tool"),
+            ("App redesign case study", "Build your portfolio website", "Reach out to local businesses"),
+            ("Freelance or internship work", "Refine portfolio case studies", "Prepare for design interviews"),
+            ("Apply to studios and agencies", "Pitch freelance clients", "Keep creating"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Publish your portfolio on Behance and a personal site",
+            "Resources": "Behance Jobs, Dribbble, LinkedIn, Internshala, Upwork",
+            "Networking": "Join design communities and take part in challenges",
+            "Application Strategy": "Mix freelance clients with studio and agency applications",
+        },
+    },
+    "sports": {
+        "entry": "Coaching/physical education diplomas or degrees, or fitness certifications",
+        "salary": "₹2.5-5 LPA at entry, ₹6-15 LPA for senior coaches and specialists",
+        "next": "Get certified and start coaching or assisting at a club",
+        "skills": [
+            ("Exercise Science", "Safe training needs anatomy and physiology", "2-3 months", "ACE resources, NSCA guides"),
+            ("Nutrition Basics", "Clients expect diet guidance with training", "1-2 months", "Precision Nutrition, Coursera"),
+            ("Coaching & Communication", "Motivating people is the core of the job", "Ongoing", "Coaching clinics, mentorship"),
+            ("First Aid & Injury Prevention", "Required wherever people train", "1-2 days", "Red Cross, St John Ambulance"),
+            ("Social Media & Personal Branding", "Most trainers find clients online", "1 month", "Instagram and YouTube creator guides"),
+        ],
+        "certs": [
+            ("ACE/ACSM Personal Trainer", "Internationally recognised fitness credential", "ACE/ACSM, ~$500", "3-4 months"),
+            ("Yoga Certification (RYT-200)", "Standard for yoga instructors", "Yoga Alliance schools", "1-2 months"),
+            ("NIS Coaching Diploma", "Official route to coaching in India", "SAI/NIS Patiala", "1 year"),
+            ("First Aid & CPR", "Mandatory for gyms and clubs", "Red Cross, ~₹1,500", "1 day"),
+        ],
+        "projects": [
+            ("12-Week Training Program", "Spreadsheets, tracking apps", "3 months", "Program design with measurable results"),
+            ("Fitness Content Channel", "Instagram/YouTube", "Ongoing", "Reach and credibility"),
+            ("Community Fitness Camp", "Local park or school", "2-4 weeks", "Leading groups"),
+            ("Athlete Performance Log", "Wearables, Excel", "Ongoing", "Data-driven coaching"),
+        ],
+        "roadmap": [
+            ("Choose a certification path", "Start your own structured training", "Learn exercise basics"),
+            ("Enrol in the certification course", "Assist at a gym or club", "Study nutrition basics"),
+            ("Complete first aid and CPR", "Coach one friend or client", "Start a content channel"),
+            ("Finish the certification exam", "Run a community fitness camp", "Network with coaches"),
+            ("Take paid clients or a club role", "Collect testimonials", "Specialise further"),
+            ("Apply to gyms, schools and academies", "Grow your client base", "Plan advanced certifications"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Get certified and collect testimonials from first clients",
+            "Resources": "Gym chains, sports academies, schools and fitness platforms",
+            "Networking": "Attend sports events and coaching clinics",
+            "Application Strategy": "Start as an assistant coach or trainer and build clients on the side",
+        },
+    },
+    "vocational": {
+        "entry": "ITI/polytechnic or a short skill course with apprenticeship",
+        "salary": "₹1.5-3.5 LPA at entry, ₹4-8 LPA for experienced or self-employed tradespeople",
+        "next": "Enrol in an ITI or PMKVY course and find an apprenticeship",
+        "skills": [
+            ("Trade Fundamentals", "Customers pay for reliable, safe work", "6-12 months", "ITI courses, PMKVY training centres"),
+            ("Workplace Safety", "Prevents injuries and is required on sites", "2-4 weeks", "ITI safety modules, DGFASLI guidance"),
+            ("Customer Service", "Repeat customers build your income", "Ongoing", "On-the-job practice"),
+            ("Basic Business & Billing", "Needed to work independently", "1 month", "Udyam registration guides, Tally basics"),
+            ("Digital Payments & Online Listings", "Customers find services online", "1-2 weeks", "Google Business Profile, UrbanCompany onboarding"),
+        ],
+        "certs": [
+            ("NCVT/ITI Trade Certificate", "The recognised qualification for trades", "ITI, low fees", "1-2 years"),
+            ("PMKVY Skill Certificate", "Government-backed short courses", "PMKVY, free", "2-6 months"),
+            ("National Apprenticeship Certificate", "Paid training with a recognised credential", "NAPS", "1 year"),
+            ("Safety Certification", "Required by many employers", "Various providers", "1-2 weeks"),
+        ],
+        "projects": [
+            ("Apprenticeship Work Log", "Photos and notes of jobs done", "Ongoing", "Proof of practical experience"),
+            ("Neighbourhood Service Offering", "WhatsApp Business, Google Business Profile", "1 month", "Finding your first customers"),
+            ("Tool and Safety Kit Setup", "Trade tools", "1-2 weeks", "Readiness for independent work"),
+            ("Portfolio of Completed Jobs", "Smartphone photos, reviews", "Ongoing", "Trust for new customers"),
+        ],
+        "roadmap": [
+            ("Find an ITI or PMKVY centre", "Visit working tradespeople", "Learn safety basics"),
+            ("Start the course", "Practise basic tasks daily", "Buy a starter tool kit"),
+            ("Apply for an apprenticeship", "Learn billing and digital payments", "Document your work"),
+            ("Work under an experienced professional", "Take on small jobs", "Collect customer reviews"),
+            ("Complete certification", "Set up a Google Business Profile", "Join service platforms"),
+            ("Apply for jobs or start independently", "Build repeat customers", "Plan an advanced course"),
+        ],
+        "job_search": {
+            "Immediate Steps": "Register on the National Apprenticeship portal and local job fairs",
+            "Resources": "Apprenticeship India, NCS portal, UrbanCompany, local contractors",
+            "Networking": "Work with established tradespeople and ask for referrals",
+            "Application Strategy": "Start as an apprentice, then move to jobs or self-employment",
+        },
+    },
+}
+
+# question -> (track for its options, {option: career title or (track, career title)})
+TEMPLATE_CAREERS = {
+    "career_interest_10th": ("engineering", {
+        "Science & Engineering (PCM)": "Engineer",
+        "Medical & Healthcare (PCB)": ("medical", "Doctor / Healthcare Professional"),
+        "Commerce & Business (Accounting, Finance)": ("commerce", "Accountant / Finance Professional"),
+        "Arts & Humanities (Literature, History, Psychology)": ("arts", "Humanities Professional"),
+        "Computer Science & Technology": ("software", "Software Developer"),
+        "Creative Fields (Design, Music, Arts)": ("creative", "Designer"),
+        "Sports & Fitness": ("sports", "Sports & Fitness Professional"),
+        "Vocational/Technical Skills": ("vocational", "Skilled Technician"),
+    }),
+    "engineering_interest": ("engineering", {
+        "Computer Science & Software Development": ("software", "Software Engineer"),
+        "Artificial Intelligence & Machine Learning": ("data", "Machine Learning Engineer"),
+        "Mechanical Engineering": "Mechanical Engineer",
+        "Civil Engineering & Architecture": "Civil Engineer",
+        "Electrical & Electronics Engineering": "Electrical & Electronics Engineer",
+        "Aerospace Engineering": "Aerospace Engineer",
+        "Chemical Engineering": "Chemical Engineer",
+        "Biotechnology Engineering": "Biotechnology Engineer",
+        "Robotics & Automation": "Robotics Engineer",
+        "Data Science & Analytics": ("data", "Data Scientist"),
+    }),
+    "medical_interest": ("medical", {
+        "MBBS (Doctor)": "Doctor (MBBS)",
+        "BDS (Dentistry)": "Dentist",
+        "BAMS (Ayurveda)": "Ayurvedic Doctor",
+        "BHMS (Homeopathy)": "Homeopathic Doctor",
+        "B.Pharm (Pharmacy)": "Pharmacist",
+        "Nursing (B.Sc Nursing)": "Nurse",
+        "Physiotherapy (BPT)": "Physiotherapist",
+        "Medical Lab Technology": "Medical Lab Technologist",
+        "Veterinary Science": "Veterinarian",
+        "Public Health": "Public Health Specialist",
+        "Biotechnology (Medical focus)": "Medical Biotechnologist",
+    }),
+    "commerce_interest": ("commerce", {
+        "Chartered Accountancy (CA)": "Chartered Accountant",
+        "Company Secretary (CS)": "Company Secretary",
+        "Cost & Management Accountant (CMA)": "Cost & Management Accountant",
+        "Bachelor of Commerce (B.Com)": "Accountant",
+        "Business Administration (BBA/MBA)": "Business Manager",
+        "Banking & Finance": "Banking Professional",
+        "Stock Market & Investment": "Equity Research Analyst",
+        "Economics": "Economist",
+        "Actuarial Science": "Actuary",
+        "Digital Marketing & E-commerce": ("creative", "Digital Marketer"),
+        "Entrepreneurship/Startup": "Entrepreneur",
+    }),
+    "arts_interest": ("arts", {
+        "Psychology": "Psychologist / Counsellor",
+        "Sociology": "Sociologist / Social Researcher",
+        "Literature & Languages": "Writer / Translator",
+        "History & Archaeology": "Historian / Archaeologist",
+        "Political Science & Law": "Policy Analyst",
+        "Journalism & Mass Communication": "Journalist",
+        "Teaching & Education": "Teacher",
+        "Social Work": "Social Worker",
+        "Philosophy": "Researcher / Educator",
+        "Fashion & Design": ("creative", "Fashion Designer"),
+    }),
+    "tech_interest_school": ("software", {
+        "App Development (Android/iOS)": "Mobile App Developer",
+        "Game Development": "Game Developer",
+        "Website Development": "Web Developer",
+        "Coding/Programming": "Software Developer",
+        "Artificial Intelligence": ("data", "AI Engineer"),
+        "Cybersecurity": "Cybersecurity Analyst",
+        "Robotics": ("engineering", "Robotics Engineer"),
+        "3D Design & Animation": ("creative", "3D Artist / Animator"),
+        "Video Editing": ("creative", "Video Editor"),
+        "Graphic Design": ("creative", "Graphic Designer"),
+    }),
+    "creative_interest": ("creative", {
+        "Graphic Design": "Graphic Designer",
+        "UI/UX Design": "UI/UX Designer",
+        "Fashion Design": "Fashion Designer",
+        "Interior Design": "Interior Designer",
+        "Music Production": "Music Producer",
+        "Photography & Videography": "Photographer / Videographer",
+        "Animation & VFX": "Animator / VFX Artist",
+        "Fine Arts (Painting, Sculpture)": "Fine Artist",
+        "Content Creation (YouTube, Instagram)": "Content Creator",
+        "Writing (Creative, Technical)": ("arts", "Writer"),
+    }),
+    "sports_interest": ("sports", {
+        "Professional Athlete": "Professional Athlete",
+        "Sports Coaching": "Sports Coach",
+        "Physical Education Teacher": "Physical Education Teacher",
+        "Fitness Trainer/Gym Instructor": "Fitness Trainer",
+        "Yoga Instructor": "Yoga Instructor",
+        "Sports Management": "Sports Manager",
+        "Physiotherapy": ("medical", "Sports Physiotherapist"),
+        "Nutritionist/Dietitian": "Sports Nutritionist",
+        "Sports Journalism": ("arts", "Sports Journalist"),
+    }),
+    "vocational_interest": ("vocational", {
+        "Electrician": "Electrician",
+        "Plumber": "Plumber",
+        "Carpenter": "Carpenter",
+        "Mechanic (Auto/Bike)": "Automobile Mechanic",
+        "Welding": "Welder",
+        "Electronics Repair": "Electronics Repair Technician",
+        "Computer Hardware & Networking": "Hardware & Networking Technician",
+        "Mobile Repair": "Mobile Repair Technician",
+        "Beauty & Cosmetology": "Beautician / Cosmetologist",
+        "Culinary Arts (Chef/Baker)": "Chef / Baker",
+        "Tailoring & Fashion": "Tailor / Fashion Technician",
+    }),
+    "tech_interest_ug": ("software", {
+        "Software Development": "Software Engineer",
+        "Web Development (Frontend/Backend/Full Stack)": "Full Stack Developer",
+        "Mobile App Development": "Mobile App Developer",
+        "Data Science & Analytics": ("data", "Data Analyst / Data Scientist"),
+        "Artificial Intelligence & ML": ("data", "Machine Learning Engineer"),
+        "Cloud Computing (AWS/Azure/GCP)": "Cloud Engineer",
+        "Cybersecurity": "Cybersecurity Analyst",
+        "DevOps": "DevOps Engineer",
+        "UI/UX Design": ("creative", "UI/UX Designer"),
+        "Game Development": "Game Developer",
+        "Blockchain Technology": "Blockchain Developer",
+    }),
+    "engineering_branch": ("engineering", {
+        "Computer Science/IT": ("software", "Software Engineer"),
+        "Mechanical Engineering": "Mechanical Engineer",
+        "Civil Engineering": "Civil Engineer",
+        "Electrical/Electronics (ECE/EEE)": "Electronics Engineer",
+        "Chemical Engineering": "Chemical Engineer",
+        "Aerospace Engineering": "Aerospace Engineer",
+        "Biotechnology": "Biotechnology Engineer",
+    }),
+    "current_field_professional": ("software", {
+        "Software Development/IT": "Senior Software Engineer",
+        "Data Science/Analytics": ("data", "Senior Data Scientist"),
+        "Finance/Banking": ("commerce", "Finance Manager"),
+        "Healthcare": ("medical", "Healthcare Administrator"),
+        "Manufacturing": ("engineering", "Manufacturing / Operations Engineer"),
+    }),
+    "career_interest_general": ("software", {
+        "Technology & Software": "Software Developer",
+        "Healthcare & Medicine": ("medical", "Healthcare Professional"),
+        "Business & Finance": ("commerce", "Business / Finance Professional"),
+        "Creative & Design": ("creative", "Designer"),
+        "Education & Teaching": ("arts", "Teacher / Trainer"),
+        "Engineering & Manufacturing": ("engineering", "Engineer"),
+        "Sports & Fitness": ("sports", "Fitness Professional"),
+    }),
+}
+
+# Sections the LLM still writes when a template answers first
+TEMPLATE_LLM_SECTIONS = ["job_search", "final_advice"]
+
+class TemplateEngine:
+    """Rule-based analyses for profiles whose answers map to a known career track.
+    
+    The career table is keyed by (profile field, option) through the compiled
+    tree's per-question field mapping, so a profile alone is enough to look up
+    its careers. Answers to deeper (more specific) questions rank first.
+    """
+    def __init__(self, routes: CompiledQuestionTree, tracks: Dict, careers: Dict):
+        self.tracks = tracks
+        self.careers = {}  # (field, option) -> (track, title, question depth)
+        
+        depth = {"start": 0}
+        frontier = ["start"]
+        while frontier:
+            q_id = frontier.pop(0)
+            for child in routes._successors(q_id):
+                if child not in depth:
+                    depth[child] = depth[q_id] + 1
+                    frontier.append(child)
+        
+        for q_id, (default_track, options) in careers.items():
+            question = routes.questions.get(q_id)
+            mapping = routes.profile_fields.get(q_id)
+            if question is None or mapping is None:
+                raise ValueError(f"Template question '{q_id}' is not a profile question in the tree")
+            for option, target in options.items():
+                if option not in question["options"]:
+                    raise ValueError(f"Template option '{option}' is not an option of '{q_id}'")
+                track, title = target if isinstance(target, tuple) else (default_track, target)
+                if track not in tracks:
+                    raise ValueError(f"Template track '{track}' is not defined")
+                self.careers.setdefault((mapping[0], option), (track, title, depth.get(q_id, 0)))
+    
+    def careers_for(self, profile: Dict) -> List[tuple]:
+        """(track, title, option) for each mapped answer, most specific question first"""
+        answers = [("interests", option) for option in profile.get("interests", [])]
+        answers += [(field, profile[field]) for field in ("field", "stream") if profile.get(field)]
+        hits = [(self.careers[key], key[1]) for key in answers if key in self.careers]
+        hits.sort(key=lambda hit: -hit[0][2])  # stable: selection order within a question
+        found, seen = [], set()
+        for (track, title, _), option in hits:
+            if title not in seen:
+                seen.add(title)
+                found.append((track, title, option))
+        return found
+    
+    def analyze(self, profile: Dict) -> Optional[Dict]:
+        """Full analysis dict for a covered profile, None otherwise"""
+        careers = self.careers_for(profile)
+        if not careers:
+            return None
+        track_name = careers[0][0]
+        track = self.tracks[track_name]
+        known = {s.lower() for s in profile.get("skills", [])}
+        
+        career_matches = []
+        for rank, (career_track, title, option) in enumerate(careers[:3]):
+            info = self.tracks[career_track]
+            career_matches.append({
+                "title": title,
+                "match": str(90 - rank * 6),
+                "details": [
+                    f"Why it fits: You chose {option}",
+                    f"Entry Requirements: {info['entry']}",
+                    f"Salary Range: {info['salary']}",
+                    f"Next Steps: {info['next']}"
+                ]
+            })
+        
+        level = profile.get("education_level", "your current level")
+        advice = [
+            f"Given your background ({level}) and your interest in {careers[0][2]}, "
+            f"{career_matches[0]['title']} is a realistic goal. Start here: {track['next'][0].lower()}{track['next'][1:]}."
+        ]
+        hours = profile.get("time_commitment", "")
+        if hours[:1].isdigit() or hours.startswith("Less"):
+            advice.append(f"With {hours.split(' (')[0].lower()} a week, work through the roadmap month by month.")
+        else:
+            advice.append("Work through the roadmap month by month.")
+        if profile.get("budget") == "Free resources only":
+            advice.append("Start with the free resources listed for each skill before paying for courses.")
+        advice.append("Steady weekly progress matters more than any single course.")
+        return {
+            "career_matches": career_matches,
+            "missing_skills": [
+                {"skill": name, "details": [f"Why Critical: {why}", f"Learning Time: {duration}", f"Best Resources: {resources}"]}
+                for name, why, duration, resources in track["skills"] if name.lower() not in known
+            ][:5],
+            "certifications": [
+                {"name": name, "details": [f"Why Essential: {why}", f"Platform & Cost: {platform}", f"Duration: {duration}"]}
+                for name, why, platform, duration in track["certs"]
+            ],
+            "projects": [
+                {"name": name, "details": [f"Technologies: {tech}", f"Timeline: {timeline}", f"What It Demonstrates: {shows}"]}
+                for name, tech, timeline, shows in track["projects"]
+            ],
+            "roadmap": {f"Month {i}": list(actions) for i, actions in enumerate(track["roadmap"], 1)},
+            "job_search": dict(track["job_search"]),
+            "final_advice": ' '.join(advice),
+            "is_personalized": False,
+            "source": "template",
+            "template_track": track_name
+        }
+
+TEMPLATE_ENGINE = TemplateEngine(QUESTION_ROUTES, TEMPLATE_TRACKS, TEMPLATE_CAREERS)
+
+# Header keyword -> parser section, checked in order on header-like lines only
+SECTION_HEADERS = (
+    ("CAREER MATCHES", "careers"),
+    ("MISSING SKILLS", "skills"),
+    ("CERTIFICATIONS", "certs"),
+    ("PROJECTS", "projects"),
+    ("ROADMAP", "roadmap"),
+    ("ACTION PLAN", "job"),
+    ("JOB SEARCH", "job"),
+    ("PERSONALIZED ADVICE", "advice")
+)
+
+# List sections: item name field, longest plausible name, detail labels, detail cap
+LIST_SECTIONS = {
+    "careers": ("title", None, ("Why", "Entry", "Salary", "Next"), 5),
+    "skills": ("skill", 50, ("Why", "Learning", "Best"), 4),
+    "certs": ("name", 60, ("Why", "Platform", "Duration", "Value"), 5),
+    "projects": ("name", 70, ("Technologies", "Timeline", "What", "Where"), 5)
+}
+
+NUMBER_MARKER = re.compile(r"\d+[.)]\s*")
+
+class AnalysisParser:
+    """Single-pass state machine for the emoji-headed analysis format.
+    
+    Each line is stripped and classified once: header, new item, or detail of
+    the current item. feed() returns the section a header just closed, so the
+    streaming endpoint can emit it without re-parsing.
+    """
+    def __init__(self):
+        self.result = empty_analysis()
+        self.section = None
+        self._item = None
+        self._actions = None
+        self._advice = []
+    
+    @classmethod
+    def parse(cls, text: str) -> Dict:
+        """Parse a whole completion; the bold markers go in one pass over the text"""
+        parser = cls()
+        line_ = parser._line
+        for line in text.replace("**", "").split('\n'):
+            line = line.strip()
+            if line:
+                line_(line)
+        parser.close()
+        return parser.result
+    
+    def feed(self, raw_line: str) -> Optional[str]:
+        line = raw_line.replace("**", "").strip()
+        return self._line(line) if line else None
+    
+    def _line(self, line: str) -> Optional[str]:
+        """Classify one stripped, non-empty line without bold markers"""
+        first = line[0]
+        # Only emoji, markdown-heading or upper-case lines can be headers; bullets and
+        # numbered lines never are, so the keyword scan is skipped for them
+        if first not in "-•0123456789" and (not first.isascii() or first in "#*" or line[:4].isupper()):
+            header = self._header(line)
+            if header:
+                closed = self.close()
+                self.section = header
+                return closed
+        
+        # Strip the item marker: a bullet run or "1." / "1)"
+        text = line
+        marked = numbered = False
+        if first in "-•*":
+            text = line.lstrip("-•*").lstrip()
+            marked = True
+        elif first in "0123456789":
+            number = NUMBER_MARKER.match(line)
+            if number:
+                text = line[number.end():]
+                marked = numbered = True
+        
+        section = self.section
+        if section in LIST_SECTIONS:
+            self._list_line(text, marked, numbered)
+        elif section == "roadmap":
+            self._roadmap_line(text, marked)
+        elif section == "job":
+            if ':' in text:
+                key, value = text.split(':', 1)
+                self.result["job_search"][key.strip()] = value.strip()
+        elif section == "advice":
+            self._advice.append(line)
+        return None
+    
+    def close(self) -> Optional[str]:
+        """Finish the open section and return its name"""
+        closed = self.section
+        if closed == "advice" and self._advice:
+            self.result["final_advice"] = ' '.join(self._advice)
+        self.section = None
+        self._item = None
+        self._actions = None
+        return closed
+    
+    def _header(self, line: str) -> Optional[str]:
+        head = line.lstrip("#* ")
+        if not head or head[0] in "-•":
+            return None
+        # Headers start with an emoji or an upper-case word; body lines never get this far
+        if head[0].isascii() and not (head[0].isalpha() and head[:4].isupper()):
+            return None
+        # Keywords match case-sensitively, so body lines led by an acronym ("SQL and
+        # Python projects ...") stay body lines
+        for keyword, section in SECTION_HEADERS:
+            if keyword in head:
+                return section
+        return None
+    
+    def _list_line(self, text: str, marked: bool, numbered: bool):
+        name_field, name_limit, labels, max_details = LIST_SECTIONS[self.section]
+        
+        if self.section == "careers":
+            starts_item = '|' in text and '%' in text
+        else:
+            # Numbered lines are items; a bare bullet is an item unless it reads like "Label: detail"
+            starts_item = numbered or (
+                marked and (self._item is None or (':' not in text and not text.startswith(labels)))
+            )
+        
+        if starts_item:
+            if self.section == "careers":
+                title, rest = text.split('|', 1)
+                match = rest.split('%', 1)[0].strip()
+                item = {"title": title.strip(), "match": match if match.isdigit() else "75", "details": []}
+            elif text and (name_limit is None or len(text) < name_limit):
+                item = {name_field: text, "details": []}
+            else:
+                item = None
+            if item:
+                self._item = item
+                self.result[ANALYSIS_SECTIONS[self.section]].append(item)
+                return
+        
+        item = self._item
+        if item is not None and (marked or text.startswith(labels)):
+            if len(item["details"]) < max_details:
+                item["details"].append(text)
+    
+    def _roadmap_line(self, text: str, marked: bool):
+        if text.startswith("Month"):
+            month, _, content = text.partition(':')
+            content = content.strip()
+            self._actions = [content] if content else []
+            self.result["roadmap"][month.strip()] = self._actions
+        elif marked and self._actions is not None and len(self._actions) < 3:
+            self._actions.append(text)
+
+# Once a session's chat outgrows CHAT_HISTORY_MAX, its oldest turns are folded into
+# a rolling summary held as the first message of the history under this role
+CHAT_SUMMARY_ROLE = "summary"
+
+def chat_summary(chat_history: List) -> str:
+    if chat_history and chat_history[0]['role'] == CHAT_SUMMARY_ROLE:
+        return chat_history[0]['content']
+    return ""
+
+def chat_turns(chat_history: List) -> List:
+    """The verbatim messages, without the summary"""
+    if chat_history and chat_history[0]['role'] == CHAT_SUMMARY_ROLE:
+        return chat_history[1:]
+    return chat_history
+
+def window_messages(messages: List, budget: int) -> List:
+    """The most recent messages that together fit in budget tokens, oldest first"""
+    window = []
+    used = 0
+    for message in reversed(messages):
+        used += estimate_tokens(message['content']) + 4  # role and framing overhead
+        if used > budget:
+            break
+        window.append(message)
+    window.reverse()
+    return window
+
+def recent_chat_topics(chat_history: List) -> List[str]:
+    """The latest user messages within ANALYSIS_CHAT_TOKENS - with the rolling summary,
+    all an analysis prompt carries of the chat, and so what keys the analysis cache"""
+    user_turns = [m for m in chat_turns(chat_history) if m['role'] == 'user']
+    return [m['content'] for m in window_messages(user_turns, ANALYSIS_CHAT_TOKENS)]
+
+class CareerAgent:
+    def __init__(self):
+        self.name = "Career Coach Alex"
+        self._fanout_limits = {}  # session id -> [semaphore, fan-outs using it]
+    
+    def get_next_question(self, current_q_id: str, answer: List[str]) -> Optional[str]:
+        """Determine next question based on current answer"""
+        return QUESTION_ROUTES.next_question(current_q_id, answer)
+    
+    def _chat_messages(self, msg: str, profile: Dict, history: List = ()) -> List[Dict]:
+        """Build the chat prompt for this user's profile: the rolling summary and as many
+        earlier turns as fit in CHAT_CONTEXT_TOKENS, then the new message"""
+        # Build concise profile context
+        profile_parts = []
+        if profile.get('education'):
+            profile_parts.append(f"Education: {profile['education']}")
+        if profile.get('interests'):
+            profile_parts.append(f"Interests: {', '.join(profile['interests'][:2])}")
+        if profile.get('skills'):
+            profile_parts.append(f"Skills: {', '.join(profile['skills'][:3])}")
+        if profile.get('goals'):
+            profile_parts.append(f"Goals: {', '.join(profile['goals'][:2])}")
+        
         profile_context = '\n'.join(profile_parts) if profile_parts else "Profile being built..."
         
         system_prompt = f"""You are a friendly career advisor. Keep responses SHORT (2-3 sentences max).
@@ -854,267 +2925,346 @@ Rules:
 - Stay on topic (career, skills, jobs)
 - End with a brief follow-up question if relevant"""
         
+        summary = chat_summary(history)
+        if summary:
+            system_prompt += f"\n\nConversation so far: {summary}"
+        earlier = window_messages(chat_turns(history), CHAT_CONTEXT_TOKENS - estimate_tokens(summary))
+        
+        return (
+            [{"role": "system", "content": system_prompt}]
+            + [{"role": m["role"], "content": m["content"]} for m in earlier]
+            + [{"role": "user", "content": msg}]
+        )
+    
+    async def chat(self, history: List, msg: str, profile: Dict) -> Dict:
+        """Short, clear, relevant chat responses"""
+        history.append({"role": "user", "content": msg})
+        
         try:
-            completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": msg}
-                ],
-                model="llama-3.3-70b-versatile",
+            with stage_latency.time(operation="chat", stage="prompt_build"):
+                messages = self._chat_messages(msg, profile, history[:-1])
+            response = await llm_complete(
+                messages,
                 temperature=0.7,
-                max_tokens=150
+                max_tokens=150,
+                timeout=CHAT_TIMEOUT,
+                priority=PRIORITY_CHAT
             )
-            
-            response = completion.choices[0].message.content.strip()
-            self.chat_histories[sid].append({"role": "assistant", "content": response})
+            response = response.strip()
+            history.append({"role": "assistant", "content": response})
             
             return {"success": True, "response": response}
+        except LLMBusy:
+            raise
         except Exception as e:
             print(f"Chat error: {e}")
-            return {"success": False, "response": "I'd suggest focusing on practical projects first. What specific area interests you most?"}
+            fallbacks.inc(kind="chat")
+            return {"success": False, "response": CHAT_FALLBACK}
     
-    async def generate_analysis(self, sid: str, profile: Dict, chat_history: List) -> Dict:
-        """Generate comprehensive personalized analysis"""
+    async def chat_stream(self, history: List, msg: str, profile: Dict):
+        """Yield reply tokens as they arrive; the reply joins the history once complete"""
+        history.append({"role": "user", "content": msg})
         
-        # Build detailed profile text
-        profile_lines = []
-        profile_lines.append(f"Education Level: {profile.get('education_level', 'Not specified')}")
+        tokens = []
+        try:
+            async for delta in llm_stream(
+                self._chat_messages(msg, profile, history[:-1]),
+                temperature=0.7,
+                max_tokens=150,
+                timeout=CHAT_TIMEOUT,
+                priority=PRIORITY_CHAT
+            ):
+                tokens.append(delta)
+                yield {"event": "token", "text": delta}
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            fallbacks.inc(kind="chat")
+            if not tokens:
+                yield {"event": "token", "text": CHAT_FALLBACK}
+            response = ''.join(tokens).strip() or CHAT_FALLBACK
+            yield {"event": "done", "success": False, "response": response}
+            return
         
-        if profile.get('stream'):
-            profile_lines.append(f"Academic Stream: {profile.get('stream')}")
-        if profile.get('field'):
-            profile_lines.append(f"Field of Study: {profile.get('field')}")
-        if profile.get('interests'):
-            profile_lines.append(f"Career Interests: {', '.join(profile.get('interests', []))}")
-        if profile.get('skills'):
-            profile_lines.append(f"Current Skills: {', '.join(profile.get('skills', []))}")
-        if profile.get('experience'):
-            profile_lines.append(f"Experience Level: {profile.get('experience')}")
-        if profile.get('goals'):
-            profile_lines.append(f"Career Goals: {', '.join(profile.get('goals', []))}")
-        if profile.get('time_commitment'):
-            profile_lines.append(f"Weekly Study Time: {profile.get('time_commitment')}")
-        if profile.get('learning_style'):
-            profile_lines.append(f"Learning Style: {', '.join(profile.get('learning_style', []))}")
-        if profile.get('budget'):
-            profile_lines.append(f"Budget: {profile.get('budget')}")
-        if profile.get('location'):
-            profile_lines.append(f"Location Preference: {profile.get('location')}")
+        response = ''.join(tokens).strip()
+        history.append({"role": "assistant", "content": response})
+        yield {"event": "done", "success": True, "response": response}
+    
+    async def summarize_chat(self, summary: str, messages: List) -> str:
+        """Fold evicted chat turns into the rolling summary"""
+        transcript = '\n'.join(
+            f"{'User' if m['role'] == 'user' else 'Coach'}: {m['content']}" for m in messages
+        )
+        prompt = f"""Update the running summary of a career-coaching conversation with the new messages.
+Keep the user's goals, constraints, decisions and open questions. At most 120 words, plain text.
+
+SUMMARY SO FAR: {summary or "(none)"}
+
+NEW MESSAGES:
+{transcript}"""
+        try:
+            result = await llm_complete(
+                [{"role": "user", "content": prompt}],
+                temperature=0.2,
+                max_tokens=CHAT_SUMMARY_TOKENS,
+                timeout=CHAT_TIMEOUT,
+                priority=PRIORITY_ANALYSIS
+            )
+            return result.strip()
+        except Exception as e:
+            print(f"Chat summary error: {e}")
+            fallbacks.inc(kind="chat_summary")
+            # Keep the most recent user topics that fit
+            topics = [summary] if summary else []
+            topics += [m['content'] for m in messages if m['role'] == 'user']
+            return '; '.join(topics)[-CHAT_SUMMARY_TOKENS * 4:]
+    
+    def _profile_text(self, profile: Dict) -> str:
+        """Compact profile block, one line per answered field"""
+        lines = []
+        for field, label in PROFILE_LABELS:
+            value = profile.get(field)
+            if value:
+                lines.append(f"{label}: {', '.join(value) if isinstance(value, list) else value}")
+        return '\n'.join(lines) or "Education: Not specified"
+    
+    def _chat_context(self, chat_history: List) -> str:
+        """The rolling summary plus the latest user messages within ANALYSIS_CHAT_TOKENS"""
+        parts = []
+        summary = chat_summary(chat_history)
+        if summary:
+            parts.append(f"CONVERSATION SUMMARY: {summary}")
+        recent = recent_chat_topics(chat_history)
+        if recent:
+            parts.append(f"CHAT TOPICS: {'; '.join(recent)}")
+        return "\n\n" + '\n'.join(parts) if parts else ""
+    
+    def _analysis_messages(self, instructions: str, profile: Dict, chat_history: List) -> List[Dict]:
+        """The constant instructions, then this user's profile and chat as the variable suffix"""
+        return [
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": self._profile_text(profile) + self._chat_context(chat_history)}
+        ]
+    
+    async def _request_json_sections(self, profile: Dict, chat_history: List, keys, max_tokens: int) -> Dict:
+        """One JSON-mode completion for the given sections; returns only the valid ones"""
+        with stage_latency.time(operation="analysis", stage="prompt_build"):
+            messages = self._analysis_messages(analysis_json_prompt(tuple(keys)), profile, chat_history)
+        text = await llm_complete(
+            messages,
+            temperature=0.6,
+            max_tokens=max_tokens,
+            timeout=ANALYSIS_TIMEOUT,
+            response_format={"type": "json_object"}
+        )
+        with stage_latency.time(operation="analysis", stage="parse"):
+            try:
+                data = json_loads(text)
+            except ValueError:
+                return {}
+            if not isinstance(data, dict):
+                return {}
+            
+            sections = {}
+            for key in keys:
+                value = validate_section(key, data.get(key))
+                if value is not None:
+                    sections[key] = value
+            return sections
+    
+    @asynccontextmanager
+    async def _fanout_limit(self, sid: str):
+        """The session's section-call semaphore, shared by all its fan-outs running at once"""
+        entry = self._fanout_limits.get(sid)
+        if entry is None:
+            entry = self._fanout_limits[sid] = [asyncio.Semaphore(ANALYSIS_FANOUT_CONCURRENCY), 0]
+        entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._fanout_limits[sid]
+    
+    async def _fan_out_sections(self, sid: str, profile: Dict, chat_history: List, keys: List[str]) -> Dict:
+        """Request each section in its own JSON call; a session runs up to ANALYSIS_FANOUT_CONCURRENCY
+        section calls at once, however many of its analyses are being generated"""
+        async with self._fanout_limit(sid) as limit:
+            return await self._request_sections(profile, chat_history, keys, limit)
+    
+    async def _request_sections(self, profile: Dict, chat_history: List, keys: List[str], limit: asyncio.Semaphore) -> Dict:
+        async def request(key):
+            async with limit:
+                try:
+                    return await self._request_json_sections(profile, chat_history, [key], SECTION_MAX_TOKENS[key])
+                except LLMBusy:
+                    raise
+                except Exception as e:
+                    print(f"Section '{key}' error: {e}")
+                    fallbacks.inc(kind="section")
+                    return {}
         
-        profile_text = "USER PROFILE:\n" + '\n'.join(profile_lines)
+        tasks = [asyncio.ensure_future(request(key)) for key in keys]
+        try:
+            results = await asyncio.gather(*tasks)
+        except LLMBusy:
+            for task in tasks:
+                task.cancel()
+            raise
         
-        chat_context = ""
-        if chat_history:
-            recent = [m['content'][:80] for m in chat_history[-4:] if m['role'] == 'user']
-            if recent:
-                chat_context = f"\n\nCHAT TOPICS: {'; '.join(recent)}"
+        sections = {}
+        for result in results:
+            sections.update(result)
+        return sections
+    
+    async def _generate_fanout_analysis(self, sid: str, profile: Dict, chat_history: List) -> Dict:
+        """All sections generated concurrently; latency tracks the slowest section, not the sum"""
+        sections = await self._fan_out_sections(sid, profile, chat_history, list(ANALYSIS_SCHEMA))
+        if not sections:
+            raise RuntimeError("every analysis section failed")
         
-        prompt = f"""Create a DETAILED career analysis based on this SPECIFIC user's profile.
-
-{profile_text}{chat_context}
-
-FORMAT EXACTLY AS:
-
-🎯 TOP 3 CAREER MATCHES
-For each career (numbered 1-3):
-- Job Title | XX% match
-- Why it fits: [Reference their specific interests/skills/education]
-- Entry Requirements: [What they need]
-- Salary Range: [Realistic for their level]
-- Next Steps: [Specific actions]
-
-💪 MISSING SKILLS (Priority Order)
-For each skill (numbered 1-5):
-- Skill Name
-- Why Critical: [For their target careers]
-- Learning Time: [With their study hours]
-- Best Resources: [2-3 specific courses/platforms]
-
-📜 REQUIRED CERTIFICATIONS
-For each cert (numbered 1-4):
-- Certification Name
-- Why Essential: [Career impact]
-- Platform & Cost
-- Duration
-- Value: [How it helps]
-
-🚀 PORTFOLIO PROJECTS
-For each project (numbered 1-4):
-- Project Name
-- Technologies: [Match their field]
-- Timeline: [Based on study time]
-- What It Demonstrates
-- Where to Showcase
-
-🗺️ 6-MONTH ROADMAP
-Month 1: [Focus area with 3 specific actions]
-Month 2: [Next phase with 3 actions]
-Month 3: [Skill building with 3 actions]
-Month 4: [Project work with 3 actions]
-Month 5: [Portfolio completion with 3 actions]
-Month 6: [Goal achievement with 3 actions]
-
-💼 ACTION PLAN
-- Immediate Steps: [What to do this week]
-- Resources: [Specific platforms/courses]
-- Networking: [Where to connect]
-- Application Strategy: [If job-seeking]
-
-💡 PERSONALIZED ADVICE
-[3-4 sentences addressing their specific situation, education level, and motivational guidance]
-
-Make EVERYTHING specific to THIS user."""
+        analysis = empty_analysis()
+        analysis.update(sections)
+        return self._fill_defaults(analysis, profile)
+    
+    async def _generate_json_analysis(self, sid: str, profile: Dict, chat_history: List) -> Dict:
+        """Schema-validated JSON analysis; only sections that fail validation are re-requested"""
+        result = await self._request_json_sections(profile, chat_history, list(ANALYSIS_SCHEMA), 2500)
+        
+        invalid = [key for key in ANALYSIS_SCHEMA if key not in result]
+        if invalid:
+            result.update(await self._fan_out_sections(sid, profile, chat_history, invalid))
+        
+        analysis = empty_analysis()
+        analysis.update(result)
+        return self._fill_defaults(analysis, profile)
+    
+    def sections_affected(self, messages: List) -> List[str]:
+        """Analysis sections the given chat messages touch; the advice is always refreshed"""
+        text = ' '.join(m['content'].lower() for m in messages if m['role'] == 'user')
+        keys = [key for key, words in SECTION_TOPICS.items() if any(word in text for word in words)]
+        return keys + ["final_advice"]
+    
+    async def regenerate_sections(self, sid: str, profile: Dict, chat_history: List, previous: Dict, new_messages: List) -> Dict:
+        """Regenerate only the sections new chat topics affect and merge them into the previous
+        analysis; None when any of them failed, as the merge would still be stale"""
+        keys = self.sections_affected(new_messages)
+        sections = await self._fan_out_sections(sid, profile, chat_history, keys)
+        if any(key not in sections for key in keys):
+            return None
+        analysis = copy.deepcopy(previous)
+        analysis.pop("regenerated_sections", None)
+        analysis.pop("personalization_pending", None)
+        analysis.update(sections)
+        analysis["regenerated_sections"] = list(sections)
+        return analysis
+    
+    async def personalize(self, sid: str, profile: Dict, chat_history: List, base: Dict) -> Dict:
+        """Have the LLM write the sections a template analysis leaves generic"""
+        sections = await self._fan_out_sections(sid, profile, chat_history, TEMPLATE_LLM_SECTIONS)
+        analysis = copy.deepcopy(base)
+        analysis.pop("personalization_pending", None)
+        analysis.update(sections)
+        analysis["is_personalized"] = bool(sections)
+        analysis["personalized_sections"] = list(sections)
+        return analysis
+    
+    async def generate_analysis(self, sid: str, profile: Dict, chat_history: List) -> Dict:
+        """Generate comprehensive personalized analysis"""
+        if ANALYSIS_MODE in ("json", "fanout"):
+            try:
+                if ANALYSIS_MODE == "fanout":
+                    return await self._generate_fanout_analysis(sid, profile, chat_history)
+                return await self._generate_json_analysis(sid, profile, chat_history)
+            except LLMBusy:
+                raise
+            except Exception as e:
+                print(f"Analysis error: {e}")
+                return self._fallback_analysis(profile)
+        
+        with stage_latency.time(operation="analysis", stage="prompt_build"):
+            messages = self._analysis_messages(ANALYSIS_TEXT_PROMPT, profile, chat_history)
         
         try:
-            completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": "Generate my comprehensive career analysis."}
-                ],
-                model="llama-3.3-70b-versatile",
+            analysis_text = await llm_complete(
+                messages,
                 temperature=0.6,
-                max_tokens=2500
+                max_tokens=2500,
+                timeout=ANALYSIS_TIMEOUT
             )
+            with stage_latency.time(operation="analysis", stage="parse"):
+                return self._parse_analysis(analysis_text, profile)
             
-            analysis_text = completion.choices[0].message.content
-            return self._parse_analysis(analysis_text, profile)
-            
+        except LLMBusy:
+            raise
         except Exception as e:
             print(f"Analysis error: {e}")
             return self._fallback_analysis(profile)
     
-    def _parse_analysis(self, text: str, profile: Dict) -> Dict:
-        """Parse structured analysis - same as before"""
-        result = {
-            "career_matches": [],
-            "missing_skills": [],
-            "certifications": [],
-            "projects": [],
-            "roadmap": {},
-            "job_search": {},
-            "final_advice": "",
-            "is_personalized": True
-        }
+    async def stream_analysis(self, sid: str, profile: Dict, chat_history: List):
+        """Yield each analysis section as soon as the next section header closes it"""
+        messages = self._analysis_messages(ANALYSIS_TEXT_PROMPT, profile, chat_history)
+        parser = AnalysisParser()
+        pending = ""
         
-        lines = text.split('\n')
-        current_section = None
-        
-        for i, line in enumerate(lines):
-            line = line.strip()
-            if not line:
-                continue
-            
-            if "CAREER MATCHES" in line:
-                current_section = "careers"
-            elif "MISSING SKILLS" in line:
-                current_section = "skills"
-            elif "CERTIFICATIONS" in line:
-                current_section = "certs"
-            elif "PORTFOLIO PROJECTS" in line or "PROJECTS" in line:
-                current_section = "projects"
-            elif "ROADMAP" in line:
-                current_section = "roadmap"
-            elif "ACTION PLAN" in line or "JOB SEARCH" in line:
-                current_section = "job"
-            elif "PERSONALIZED ADVICE" in line:
-                current_section = "advice"
-                advice_lines = []
-                for j in range(i+1, min(i+8, len(lines))):
-                    if lines[j].strip() and not lines[j].startswith(('🎯', '💪', '📜', '🚀', '🗺️', '💼')):
-                        advice_lines.append(lines[j].strip())
-                result["final_advice"] = ' '.join(advice_lines)
-                continue
-            
-            if current_section == "careers":
-                if line.startswith(('-', '1.', '2.', '3.')):
-                    if '|' in line and '%' in line:
-                        parts = line.split('|')
-                        title = parts[0].split('.', 1)[-1].strip().strip('-').strip()
-                        match = parts[1].split('%')[0].strip()
-                        
-                        details = []
-                        for j in range(i+1, min(i+6, len(lines))):
-                            if lines[j].strip().startswith(('-', '•', 'Why', 'Entry', 'Salary', 'Next')):
-                                details.append(lines[j].strip().lstrip('-•').strip())
-                        
-                        result["career_matches"].append({
-                            "title": title,
-                            "match": match if match.isdigit() else "75",
-                            "details": details[:5]
-                        })
-            
-            elif current_section == "skills":
-                if line.startswith(('-', '1.', '2.', '3.', '4.', '5.')):
-                    skill_name = line.split('.', 1)[-1].strip().strip('-').strip()
-                    if skill_name and len(skill_name) < 50:
-                        details = []
-                        for j in range(i+1, min(i+5, len(lines))):
-                            if lines[j].strip().startswith(('-', '•', 'Why', 'Learning', 'Best')):
-                                details.append(lines[j].strip().lstrip('-•').strip())
-                        
-                        result["missing_skills"].append({
-                            "skill": skill_name,
-                            "details": details[:4]
-                        })
-            
-            elif current_section == "certs":
-                if line.startswith(('-', '1.', '2.', '3.', '4.')):
-                    cert_name = line.split('.', 1)[-1].strip().strip('-').strip()
-                    if cert_name and len(cert_name) < 60:
-                        details = []
-                        for j in range(i+1, min(i+6, len(lines))):
-                            if lines[j].strip().startswith(('-', '•', 'Why', 'Platform', 'Duration', 'Value')):
-                                details.append(lines[j].strip().lstrip('-•').strip())
-                        
-                        result["certifications"].append({
-                            "name": cert_name,
-                            "details": details[:5]
-                        })
-            
-            elif current_section == "projects":
-                if line.startswith(('-', '1.', '2.', '3.', '4.')):
-                    project_name = line.split('.', 1)[-1].strip().strip('-').strip()
-                    if project_name and len(project_name) < 70:
-                        details = []
-                        for j in range(i+1, min(i+6, len(lines))):
-                            if lines[j].strip().startswith(('-', '•', 'Technologies', 'Timeline', 'What', 'Where')):
-                                details.append(lines[j].strip().lstrip('-•').strip())
-                        
-                        result["projects"].append({
-                            "name": project_name,
-                            "details": details[:5]
-                        })
-            
-            elif current_section == "roadmap":
-                if line.startswith('Month'):
-                    month_num = line.split(':')[0].strip()
-                    month_content = line.split(':', 1)[1].strip() if ':' in line else ''
-                    actions = [month_content] if month_content else []
-                    
-                    for j in range(i+1, min(i+4, len(lines))):
-                        if lines[j].strip().startswith(('-', '•', '1.', '2.', '3.')):
-                            actions.append(lines[j].strip().lstrip('-•123.').strip())
-                    
-                    result["roadmap"][month_num] = actions[:3]
+        try:
+            async for delta in llm_stream(
+                messages,
+                temperature=0.6,
+                max_tokens=2500,
+                timeout=ANALYSIS_TIMEOUT
+            ):
+                pending += delta
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    event = self._section_event(parser, parser.feed(line))
+                    if event:
+                        yield event
             
-            elif current_section == "job":
-                if ':' in line:
-                    key = line.split(':')[0].strip()
-                    value = line.split(':', 1)[1].strip()
-                    result["job_search"][key] = value
+            parser.feed(pending)
+            event = self._section_event(parser, parser.close())
+            if event:
+                yield event
+            analysis = self._fill_defaults(parser.result, profile)
+        except Exception as e:
+            print(f"Analysis stream error: {e}")
+            analysis = self._fallback_analysis(profile)
         
-        if not result["career_matches"]:
-            result["career_matches"] = self._get_default_careers(profile)
-        if not result["missing_skills"]:
-            result["missing_skills"] = self._get_default_skills(profile)
-        if not result["certifications"]:
-            result["certifications"] = self._get_default_certs(profile)
-        if not result["projects"]:
-            result["projects"] = self._get_default_projects(profile)
-        if not result["roadmap"]:
-            result["roadmap"] = self._get_default_roadmap(profile)
-        if not result["final_advice"]:
-            result["final_advice"] = self._get_default_advice(profile)
+        yield {"event": "done", "analysis": analysis}
+    
+    def _section_event(self, parser: "AnalysisParser", section: Optional[str]) -> Optional[Dict]:
+        """Stream event for a section the parser just closed"""
+        if not section:
+            return None
+        key = ANALYSIS_SECTIONS[section]
+        data = parser.result[key]
+        if not data:
+            return None
+        return {"event": "section", "section": key, "data": data}
+    
+    def _parse_analysis(self, text: str, profile: Dict) -> Dict:
+        """Parse structured analysis in a single pass"""
+        return self._fill_defaults(AnalysisParser.parse(text), profile)
+    
+    def _fill_defaults(self, result: Dict, profile: Dict) -> Dict:
+        """Replace sections the model left empty with template or generic guidance, listing
+        them under defaulted_sections"""
+        template = TEMPLATE_ENGINE.analyze(profile) if ANALYSIS_TEMPLATES != "off" else None
+        defaults = {
+            "career_matches": self._get_default_careers,
+            "missing_skills": self._get_default_skills,
+            "certifications": self._get_default_certs,
+            "projects": self._get_default_projects,
+            "roadmap": self._get_default_roadmap,
+            "final_advice": self._get_default_advice
+        }
+        defaulted = []
+        for key, default in defaults.items():
+            if not result[key]:
+                result[key] = template[key] if template else default(profile)
+                fallbacks.inc(kind="section_template" if template else "section_default")
+                defaulted.append(key)
+        if defaulted:
+            result["defaulted_sections"] = defaulted
         
         return result
     
@@ -1161,6 +3311,12 @@ Make EVERYTHING specific to THIS user."""
         return f"Based on your profile, focus on consistent learning and practical application. Your journey is unique - embrace it!"
     
     def _fallback_analysis(self, profile):
+        template = TEMPLATE_ENGINE.analyze(profile) if ANALYSIS_TEMPLATES != "off" else None
+        if template:
+            fallbacks.inc(kind="analysis_template")
+            template["is_fallback"] = True
+            return template
+        fallbacks.inc(kind="analysis")
         return {
             "career_matches": self._get_default_careers(profile),
             "missing_skills": self._get_default_skills(profile),
@@ -1173,16 +3329,788 @@ Make EVERYTHING specific to THIS user."""
                 "Networking": "Connect on LinkedIn"
             },
             "final_advice": self._get_default_advice(profile),
-            "is_personalized": True
+            "is_personalized": True,
+            "is_fallback": True
+        }
+
+class TTLCache:
+    """LRU cache with an idle TTL, item and byte caps, and hit/eviction counters"""
+    def __init__(self, max_items: int, ttl: float, max_bytes: Optional[int] = None, sizeof=None, on_evict=None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._on_evict = on_evict
+        self._data = OrderedDict()  # key -> (value, last_access, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"ttl": 0, "lru": 0, "memory": 0}
+    
+    def __len__(self):
+        return len(self._data)
+    
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        value, last_access, size = entry
+        now = time.monotonic()
+        if self.ttl and now - last_access > self.ttl:
+            self._evict(key, "ttl")
+            self.misses += 1
+            return None
+        
+        self._data[key] = (value, now, size)
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key, value):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.bytes -= old[2]
+        
+        size = self._sizeof(value)
+        self._data[key] = (value, time.monotonic(), size)
+        self.bytes += size
+        self._enforce_limits(keep=key)
+    
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+        self.bytes -= entry[2]
+        return entry[0]
+    
+    def _evict(self, key, reason: str):
+        value = self.pop(key)
+        self.evictions[reason] += 1
+        if self._on_evict:
+            self._on_evict(key, value)
+    
+    def _enforce_limits(self, keep=None):
+        # Entries are kept in access order, so the idle ones are always at the front
+        now = time.monotonic()
+        while self._data and self.ttl:
+            key, (_, last_access, _) = next(iter(self._data.items()))
+            if key == keep or now - last_access <= self.ttl:
+                break
+            self._evict(key, "ttl")
+        
+        while len(self._data) > self.max_items:
+            self._evict(next(iter(self._data)), "lru")
+        
+        while self.max_bytes and self.bytes > self.max_bytes and len(self._data) > 1:
+            self._evict(next(iter(self._data)), "memory")
+    
+    def stats(self) -> Dict:
+        return {
+            "size": len(self._data),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": dict(self.evictions)
+        }
+
+def _approx_size(value) -> int:
+    """Cheap estimate of a JSON-like value's footprint in bytes"""
+    return len(json.dumps(value, default=str))
+
+CROCKFORD_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+def new_session_id() -> str:
+    """ULID-style ID: 48-bit millisecond timestamp + 80 random bits, Crockford base32.
+    
+    Sorts by creation time and never consults the session store.
+    """
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(os.urandom(10), "big")
+    chars = []
+    for _ in range(26):
+        chars.append(CROCKFORD_BASE32[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+class SessionStore:
+    """Persistence interface for questionnaire sessions.
+    
+    Handlers read a session with get() and write their changes with update(),
+    which applies a mutation to the freshly stored copy in one step. A handler
+    that awaits the LLM in between therefore never writes back a stale document
+    over changes other requests (or workers) made meanwhile.
+    """
+    def new_session(self) -> Dict:
+        return {
+            "answers": {},
+            "created": datetime.now().isoformat(),
+            "profile": {},
+            "chat_history": []
         }
+    
+    async def get(self, sid: Optional[str]) -> Optional[Dict]:
+        raise NotImplementedError
+    
+    async def save(self, sid: str, session: Dict):
+        raise NotImplementedError
+    
+    async def update(self, sid: str, mutate, create: bool = False) -> Optional[Dict]:
+        """Apply mutate(session) to the stored session and save it atomically; a missing
+        session is started fresh when create is set, otherwise nothing is written.
+        
+        This default is atomic only for stores whose get and save never suspend.
+        """
+        session = await self.get(sid)
+        if session is None:
+            if not create:
+                return None
+            session = self.new_session()
+        mutate(session)
+        await self.save(sid, session)
+        return session
+    
+    async def delete(self, sid: str):
+        raise NotImplementedError
+    
+    async def count(self) -> int:
+        raise NotImplementedError
+    
+    def stats(self) -> Dict:
+        return {}
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store with LRU + idle-TTL eviction and a memory cap"""
+    def __init__(self, max_sessions: int, idle_ttl: float, max_bytes: int):
+        self._cache = TTLCache(max_sessions, idle_ttl, max_bytes=max_bytes, sizeof=_approx_size)
+    
+    async def get(self, sid: Optional[str]) -> Optional[Dict]:
+        if not sid:
+            return None
+        return self._cache.get(sid)
+    
+    async def save(self, sid: str, session: Dict):
+        """Store the session and re-account its size after handlers changed it"""
+        self._cache.put(sid, session)
+    
+    async def delete(self, sid: str):
+        self._cache.pop(sid)
+    
+    async def count(self) -> int:
+        return len(self._cache)
+    
+    def stats(self) -> Dict:
+        return {"backend": "memory", **self._cache.stats()}
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a WAL-mode SQLite file, shareable by every worker on the host"""
+    PURGE_EVERY = 200
+    
+    def __init__(self, path: str, max_sessions: int, idle_ttl: float):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "sid TEXT PRIMARY KEY, data TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions(last_access)")
+        self._saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"ttl": 0, "lru": 0}
+    
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            return cursor.fetchall(), cursor.rowcount
+    
+    def _get(self, sid: str) -> Optional[Dict]:
+        now = time.time()
+        rows, _ = self._execute("SELECT data, last_access FROM sessions WHERE sid = ?", (sid,))
+        if not rows or now - rows[0][1] > self.idle_ttl:
+            self.misses += 1
+            return None
+        self._execute("UPDATE sessions SET last_access = ? WHERE sid = ?", (now, sid))
+        self.hits += 1
+        return json.loads(rows[0][0])
+    
+    UPSERT = (
+        "INSERT INTO sessions (sid, data, last_access) VALUES (?, ?, ?) "
+        "ON CONFLICT(sid) DO UPDATE SET data = excluded.data, last_access = excluded.last_access"
+    )
+    
+    def _save(self, sid: str, session: Dict):
+        self._execute(self.UPSERT, (sid, json.dumps(session, default=str), time.time()))
+        self._saved()
+    
+    def _saved(self):
+        self._saves += 1
+        if self._saves % self.PURGE_EVERY == 0:
+            self._purge()
+    
+    def _update(self, sid: str, mutate, create: bool) -> Optional[Dict]:
+        # BEGIN IMMEDIATE takes the database write lock, so the read-modify-write is
+        # atomic across threads and across every worker sharing the file
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute("SELECT data, last_access FROM sessions WHERE sid = ?", (sid,)).fetchall()
+                if rows and now - rows[0][1] <= self.idle_ttl:
+                    session = json.loads(rows[0][0])
+                elif create:
+                    session = self.new_session()
+                else:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                mutate(session)
+                self._conn.execute(self.UPSERT, (sid, json.dumps(session, default=str), now))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._saved()
+        return session
+    
+    def _purge(self):
+        _, expired = self._execute("DELETE FROM sessions WHERE last_access < ?", (time.time() - self.idle_ttl,))
+        _, overflow = self._execute(
+            "DELETE FROM sessions WHERE sid IN "
+            "(SELECT sid FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+        self.evictions["ttl"] += max(expired, 0)
+        self.evictions["lru"] += max(overflow, 0)
+    
+    async def get(self, sid: Optional[str]) -> Optional[Dict]:
+        if not sid:
+            return None
+        return await asyncio.to_thread(self._get, sid)
+    
+    async def save(self, sid: str, session: Dict):
+        await asyncio.to_thread(self._save, sid, session)
+    
+    async def update(self, sid: str, mutate, create: bool = False) -> Optional[Dict]:
+        return await asyncio.to_thread(self._update, sid, mutate, create)
+    
+    async def delete(self, sid: str):
+        await asyncio.to_thread(self._execute, "DELETE FROM sessions WHERE sid = ?", (sid,))
+    
+    async def count(self) -> int:
+        rows, _ = await asyncio.to_thread(self._execute, "SELECT COUNT(*) FROM sessions")
+        return rows[0][0]
+    
+    def stats(self) -> Dict:
+        return {"backend": "sqlite", "hits": self.hits, "misses": self.misses, "evictions": dict(self.evictions)}
+
+class RedisSessionStore(SessionStore):
+    """Sessions in any Redis-protocol server; idle TTL maps to key expiry.
+    
+    Size and LRU limits are left to the server's own maxmemory policy.
+    """
+    def __init__(self, url: str, idle_ttl: float, prefix: str = "career:session:"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND=redis needs the 'redis' package (pip install redis)")
+        self._redis = aioredis.from_url(url)
+        self.idle_ttl = max(int(idle_ttl), 1)
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, sid: Optional[str]) -> Optional[Dict]:
+        if not sid:
+            return None
+        raw = await self._redis.get(self.prefix + sid)
+        if raw is None:
+            self.misses += 1
+            return None
+        await self._redis.expire(self.prefix + sid, self.idle_ttl)
+        self.hits += 1
+        return json.loads(raw)
+    
+    async def save(self, sid: str, session: Dict):
+        await self._redis.set(self.prefix + sid, json.dumps(session, default=str), ex=self.idle_ttl)
+    
+    async def update(self, sid: str, mutate, create: bool = False) -> Optional[Dict]:
+        """Optimistic WATCH/MULTI transaction, retried when another writer got there first"""
+        from redis.exceptions import WatchError
+        key = self.prefix + sid
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    raw = await pipe.get(key)
+                    if raw is not None:
+                        session = json.loads(raw)
+                    elif create:
+                        session = self.new_session()
+                    else:
+                        await pipe.reset()
+                        return None
+                    mutate(session)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(session, default=str), ex=self.idle_ttl)
+                    await pipe.execute()
+                    return session
+                except WatchError:
+                    continue
+    
+    async def delete(self, sid: str):
+        await self._redis.delete(self.prefix + sid)
+    
+    async def count(self) -> int:
+        """Session keys only (an incremental SCAN over the prefix), as the database may be shared"""
+        count = 0
+        async for _ in self._redis.scan_iter(match=self.prefix + "*", count=1000):
+            count += 1
+        return count
+    
+    def stats(self) -> Dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+class TimedSessionStore(SessionStore):
+    """Records the latency of every operation on the wrapped store"""
+    def __init__(self, inner: SessionStore):
+        self.inner = inner
+        self.backend = inner.stats().get("backend", type(inner).__name__)
+    
+    def new_session(self) -> Dict:
+        return self.inner.new_session()
+    
+    async def get(self, sid: Optional[str]) -> Optional[Dict]:
+        with store_latency.time(op="get", backend=self.backend):
+            return await self.inner.get(sid)
+    
+    async def save(self, sid: str, session: Dict):
+        with store_latency.time(op="save", backend=self.backend):
+            await self.inner.save(sid, session)
+    
+    async def update(self, sid: str, mutate, create: bool = False) -> Optional[Dict]:
+        with store_latency.time(op="update", backend=self.backend):
+            return await self.inner.update(sid, mutate, create)
+    
+    async def delete(self, sid: str):
+        with store_latency.time(op="delete", backend=self.backend):
+            await self.inner.delete(sid)
+    
+    async def count(self) -> int:
+        return await self.inner.count()
+    
+    def stats(self) -> Dict:
+        return self.inner.stats()
+
+def create_session_store() -> SessionStore:
+    """Pick the session backend from SESSION_BACKEND (memory, sqlite or redis)"""
+    if SESSION_BACKEND == "sqlite":
+        store = SQLiteSessionStore(SESSION_DB_PATH, SESSION_MAX, SESSION_IDLE_TTL)
+    elif SESSION_BACKEND == "redis":
+        store = RedisSessionStore(REDIS_URL, SESSION_IDLE_TTL)
+    else:
+        store = InMemorySessionStore(SESSION_MAX, SESSION_IDLE_TTL, int(SESSION_MAX_MB * 1024 * 1024))
+    return TimedSessionStore(store)
+
+def _normalize(value):
+    """Canonical form for hashing: case/space-folded strings, order-free lists, no empty fields"""
+    if isinstance(value, str):
+        return ' '.join(value.lower().split())
+    if isinstance(value, list):
+        return sorted(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items() if v}
+    return value
+
+def analysis_cache_key(profile: Dict, chat_history: List) -> str:
+    """Content hash of the normalized profile plus the chat the analysis prompt sees:
+    the rolling summary and the recent chat topics"""
+    canonical = json.dumps(
+        {
+            "profile": _normalize(profile),
+            "summary": _normalize(chat_summary(chat_history)),
+            "topics": _normalize(recent_chat_topics(chat_history))
+        },
+        sort_keys=True
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class AnalysisCache:
+    """Content-addressed analysis cache: LRU/TTL in memory with an optional on-disk tier"""
+    def __init__(self, max_items: int, ttl: float, directory: Optional[str] = None):
+        self._memory = TTLCache(max_items, ttl)
+        self.ttl = ttl
+        self.directory = directory
+        self.disk_hits = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    
+    async def get(self, key: str) -> Optional[Dict]:
+        analysis = self._memory.get(key)
+        if analysis is None and self.directory:
+            analysis = await asyncio.to_thread(self._read_disk, key)
+            if analysis is not None:
+                self.disk_hits += 1
+                self._memory.put(key, analysis)
+        # Callers store and mutate the result on their session, so hand out a copy
+        return copy.deepcopy(analysis) if analysis is not None else None
+    
+    async def put(self, key: str, analysis: Dict):
+        analysis = copy.deepcopy(analysis)
+        self._memory.put(key, analysis)
+        if self.directory:
+            await asyncio.to_thread(self._write_disk, key, analysis)
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+    
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_disk(self, key: str, analysis: Dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(analysis, f)
+        os.replace(tmp_path, path)
+    
+    def stats(self) -> Dict:
+        return {**self._memory.stats(), "disk_hits": self.disk_hits}
+
+# Answers that pick the career track; the warm store is keyed on these alone, so the
+# time, budget, location and learning-style answers all share one precomputed analysis
+WARM_PROFILE_FIELDS = ("education_level", "stream", "field", "interests")
+
+def warm_profile_key(profile: Dict) -> bytes:
+    """SHA-256 digest of the normalized track-deciding part of a profile"""
+    canonical = json.dumps(_normalize({f: profile.get(f) for f in WARM_PROFILE_FIELDS}), sort_keys=True)
+    return hashlib.sha256(canonical.encode()).digest()
+
+class WarmAnalysisStore:
+    """Read-only store of analyses precomputed by warmup.py, memory-mapped at startup.
+    
+    Layout: an 8-byte magic and an entry count, then an index of fixed-size
+    (sha256 digest, offset, length) records sorted by digest, then the
+    zlib-compressed JSON blobs. A lookup is a binary search over the mapped
+    index plus one decompress; nothing is read into memory up front.
+    """
+    MAGIC = b"CGWARM01"
+    HEADER = struct.Struct("<8sI")
+    ENTRY = struct.Struct("<32sQI")
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC:
+            raise ValueError(f"{path} is not a warm analysis store")
+    
+    @classmethod
+    def open(cls, path: str) -> Optional["WarmAnalysisStore"]:
+        """The store at path, or None when it is missing or unreadable"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return cls(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Warm analysis store not loaded: {e}")
+            return None
+    
+    def _entry(self, i: int):
+        return self.ENTRY.unpack_from(self._map, self.HEADER.size + i * self.ENTRY.size)
+    
+    def _blob(self, offset: int, length: int) -> Dict:
+        return json_loads(zlib.decompress(self._map[offset:offset + length]))
+    
+    def get(self, profile: Dict) -> Optional[Dict]:
+        key = warm_profile_key(profile)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            digest, offset, length = self._entry(mid)
+            if digest == key:
+                self.hits += 1
+                return self._blob(offset, length)
+            if digest < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        self.misses += 1
+        return None
+    
+    def items(self):
+        """(digest, analysis) for every entry, in index order"""
+        for i in range(self.count):
+            digest, offset, length = self._entry(i)
+            yield digest, self._blob(offset, length)
+    
+    @classmethod
+    def write(cls, path: str, entries: Dict[bytes, Dict]):
+        """Atomically write a store holding entries (digest -> analysis)"""
+        keys = sorted(entries)
+        blobs = [zlib.compress(json.dumps(entries[k], separators=(",", ":")).encode("utf-8"), 9) for k in keys]
+        offset = cls.HEADER.size + len(keys) * cls.ENTRY.size
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(keys)))
+            for key, blob in zip(keys, blobs):
+                f.write(cls.ENTRY.pack(key, offset, len(blob)))
+                offset += len(blob)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, path)
+    
+    def stats(self) -> Dict:
+        return {"entries": self.count, "bytes": len(self._map), "hits": self.hits, "misses": self.misses}
+
+# How much one matching answer counts towards profile similarity; unlisted fields weigh 0.5
+SIMILAR_FIELD_WEIGHTS = {
+    "education_level": 1.5,
+    "stream": 1.5,
+    "field": 2.0,
+    "interests": 2.0,
+    "skills": 1.0,
+    "goals": 1.0,
+    "experience": 0.75
+}
+FREE_TEXT_WEIGHT = 0.5  # typed "Other:" answers are noisier than chosen options
+
+def profile_terms(profile: Dict) -> Dict[str, float]:
+    """Field-scoped terms of a profile: one per chosen option, and one per word of a
+    free-text "Other:" answer, so "Other: robotics kits" still matches "Other: robotics" """
+    terms = {}
+    for field, value in profile.items():
+        weight = SIMILAR_FIELD_WEIGHTS.get(field, 0.5)
+        for item in value if isinstance(value, list) else [value]:
+            if not isinstance(item, str) or not item.strip():
+                continue
+            item = _normalize(item)
+            if item.startswith("other:"):
+                words = re.findall(r"[a-z0-9+#]+", item[6:])
+                for word in words:
+                    term = f"{field}~{word}"
+                    terms[term] = terms.get(term, 0.0) + weight * FREE_TEXT_WEIGHT / len(words)
+            else:
+                term = f"{field}={item}"
+                terms[term] = terms.get(term, 0.0) + weight
+    return terms
+
+class ProfileIndex:
+    """TF-IDF nearest-neighbour index over the profiles behind cached analyses.
+    
+    Profiles are partitioned by career track (the WARM_PROFILE_FIELDS answers,
+    ignoring free-text "Other:" entries), so a neighbour is never from another
+    track. Within a track they are sparse unit vectors of profile_terms weighted
+    by inverse document frequency, held in an inverted index. A query takes its
+    heaviest terms first and stops admitting new candidates once the terms left
+    could not lift an unseen profile over the threshold. IDF is refitted once
+    additions and removals since the last fit reach a quarter of the fitted size,
+    which keeps weights current at amortized constant cost - also once the index
+    is full and only churns. The oldest entries are evicted past max_items.
+    """
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._docs = OrderedDict()  # cache key -> (track, raw terms, unit vector)
+        self._postings = {}         # track -> term -> {cache key: weight}
+        self._df = {}               # term -> number of profiles containing it
+        self._idf = {}
+        self._unseen_idf = 1.0
+        self._fitted_size = 0
+        self._changes = 0           # additions and removals since the last fit
+        self.queries = 0
+        self.hits = 0
+    
+    def __len__(self):
+        return len(self._docs)
+    
+    @staticmethod
+    def _track(profile: Dict) -> bytes:
+        def chosen(value):
+            if isinstance(value, list):
+                return [v for v in value if not (isinstance(v, str) and v.startswith("Other:"))]
+            return None if isinstance(value, str) and value.startswith("Other:") else value
+        return warm_profile_key({f: chosen(profile.get(f)) for f in WARM_PROFILE_FIELDS})
+    
+    def _vector(self, terms: Dict[str, float]) -> Dict[str, float]:
+        vector = {t: w * self._idf.get(t, self._unseen_idf) for t, w in terms.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {t: w / norm for t, w in vector.items()} if norm else {}
+    
+    def _post(self, key: str, track: bytes, vector: Dict[str, float]):
+        postings = self._postings.setdefault(track, {})
+        for t, w in vector.items():
+            postings.setdefault(t, {})[key] = w
+    
+    def _refit(self):
+        n = len(self._docs)
+        self._idf = {t: math.log((1 + n) / (1 + df)) + 1 for t, df in self._df.items()}
+        self._unseen_idf = math.log(1 + n) + 1
+        self._fitted_size = n
+        self._changes = 0
+        self._postings = {}
+        for key, (track, terms, _) in self._docs.items():
+            vector = self._vector(terms)
+            self._docs[key] = (track, terms, vector)
+            self._post(key, track, vector)
+    
+    def add(self, key: str, profile: Dict):
+        self.remove(key)
+        terms = profile_terms(profile)
+        if not terms:
+            return
+        for t in terms:
+            self._df[t] = self._df.get(t, 0) + 1
+        track = self._track(profile)
+        vector = self._vector(terms)
+        self._docs[key] = (track, terms, vector)
+        self._post(key, track, vector)
+        self._changes += 1
+        
+        while len(self._docs) > self.max_items:
+            self.remove(next(iter(self._docs)))
+        if self._changes >= max(16, self._fitted_size / 4):
+            self._refit()
+    
+    def remove(self, key: str):
+        entry = self._docs.pop(key, None)
+        if entry is None:
+            return
+        self._changes += 1
+        track, terms, _ = entry
+        for t in terms:
+            self._df[t] -= 1
+            if not self._df[t]:
+                del self._df[t]
+        postings = self._postings.get(track, {})
+        for t in terms:
+            keys = postings.get(t)
+            if keys is not None:
+                keys.pop(key, None)
+                if not keys:
+                    del postings[t]
+        if not postings:
+            self._postings.pop(track, None)
+    
+    def nearest(self, profile: Dict, threshold: float):
+        """(cache key, cosine similarity) of the closest indexed profile on the same
+        track at or above threshold, or None"""
+        self.queries += 1
+        postings = self._postings.get(self._track(profile))
+        if not postings:
+            return None
+        query = sorted(self._vector(profile_terms(profile)).items(), key=lambda tw: -tw[1])
+        remaining = 1.0  # squared norm of the query terms not yet visited
+        scores = {}
+        for term, weight in query:
+            keys = postings.get(term)
+            if keys:
+                if math.sqrt(max(remaining, 0.0)) >= threshold:
+                    for key, w in keys.items():
+                        scores[key] = scores.get(key, 0.0) + weight * w
+                elif len(keys) < len(scores):
+                    for key, w in keys.items():
+                        if key in scores:
+                            scores[key] += weight * w
+                else:
+                    for key in scores:
+                        w = keys.get(key)
+                        if w:
+                            scores[key] += weight * w
+            remaining -= weight * weight
+        
+        if not scores:
+            return None
+        key = max(scores, key=scores.get)
+        if scores[key] < threshold - 1e-9:
+            return None
+        self.hits += 1
+        return key, min(scores[key], 1.0)
+    
+    def stats(self) -> Dict:
+        return {"size": len(self._docs), "tracks": len(self._postings), "terms": len(self._df),
+                "queries": self.queries, "hits": self.hits}
 
 agent = CareerAgent()
-user_sessions = {}
+sessions = create_session_store()
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_MAX, ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_DIR)
+profile_index = ProfileIndex(ANALYSIS_CACHE_MAX)
+warm_store = WarmAnalysisStore.open(WARM_STORE_PATH)
+if warm_store is not None:
+    print(f"Warm analysis store: {warm_store.count} precomputed analyses")
 
 @app.get("/")
 async def root():
     return {"status": "active", "version": "6.0.0", "type": "dynamic"}
 
+@app.get("/stats")
+async def stats():
+    """Session store, analysis cache and LLM scheduler/resilience counters"""
+    return {
+        "sessions": sessions.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "warm_store": warm_store.stats() if warm_store is not None else None,
+        "profile_index": profile_index.stats(),
+        "llm_scheduler": llm_scheduler.stats(),
+        "llm_resilience": llm_caller.stats(),
+        "llm_backend": llm_backend.name
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint; gauges are sampled here rather than on the hot path"""
+    active_sessions.set(await sessions.count())
+    scheduler = llm_scheduler.stats()
+    llm_queue_depth.set(scheduler["queue_depth"])
+    llm_in_flight.set(scheduler["in_flight"])
+    llm_circuit_open.set(1 if llm_caller.breaker.state == "open" else 0)
+    analysis_cache_entries.set(analysis_cache.stats()["size"])
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/loop")
+async def loop_report(request: Request, limit: int = 10):
+    """Event-loop lag and the stacks most often caught blocking the loop (LOOP_MONITOR=1).
+    
+    Source paths and stacks are not for the public: without ADMIN_TOKEN the endpoint is off."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(403, "Admin token required")
+    if loop_monitor is None:
+        return {"enabled": False}
+    return loop_monitor.report(limit)
+
+@app.get("/questionnaire")
+async def questionnaire_bundle(request: Request):
+    """The whole compiled questionnaire, so clients can navigate it locally"""
+    headers = {
+        "ETag": QUESTIONNAIRE_BUNDLE["etag"],
+        "Cache-Control": "public, max-age=86400",
+        "Vary": "Accept-Encoding"
+    }
+    if request.headers.get("if-none-match") == QUESTIONNAIRE_BUNDLE["etag"]:
+        return Response(status_code=304, headers=headers)
+    
+    accepted = request.headers.get("accept-encoding", "")
+    for encoding in ("br", "gzip"):
+        if encoding in QUESTIONNAIRE_BUNDLE["encodings"] and encoding in accepted:
+            headers["Content-Encoding"] = encoding
+            return Response(QUESTIONNAIRE_BUNDLE["encodings"][encoding], media_type="application/json", headers=headers)
+    return Response(QUESTIONNAIRE_BUNDLE["encodings"]["identity"], media_type="application/json", headers=headers)
+
 @app.get("/question/{question_id}")
 async def get_question(question_id: str):
     """Get a specific question by ID"""
@@ -1195,17 +4123,8 @@ async def start_questionnaire():
     """Get the first question"""
     return {"question": QUESTION_TREE["start"]}
 
-@app.post("/answer")
-async def submit_answer(ans: QuestionAnswer):
-    sid = ans.session_id or f"s{len(user_sessions)}_{datetime.now().strftime('%H%M%S')}"
-    
-    if sid not in user_sessions:
-        user_sessions[sid] = {
-            "answers": {},
-            "created": datetime.now().isoformat(),
-            "profile": {}
-        }
-    
+def record_answer(session: Dict, ans: QuestionAnswer) -> Optional[str]:
+    """Store one answer on the session, update the profile and return the next question id"""
     # Handle custom answer
     final_answers = []
     for answer in ans.answers:
@@ -1216,41 +4135,53 @@ async def submit_answer(ans: QuestionAnswer):
     
     # Store answer
     q_data = QUESTION_TREE.get(ans.question_id, {})
-    user_sessions[sid]["answers"][ans.question_id] = {
+    session["answers"][ans.question_id] = {
         "question": q_data.get("question", ""),
         "answers": final_answers
     }
     
     # Build profile progressively
-    profile = user_sessions[sid]["profile"]
-    
-    if ans.question_id == "start":
-        profile["education_level"] = final_answers[0]
-    elif "stream" in ans.question_id or ans.question_id == "stream_12th":
-        profile["stream"] = final_answers[0]
-    elif "field" in ans.question_id or "branch" in ans.question_id:
-        profile["field"] = final_answers[0]
-    elif "interest" in ans.question_id:
-        profile.setdefault("interests", []).extend(final_answers)
-    elif "skill" in ans.question_id:
-        profile.setdefault("skills", []).extend(final_answers)
-    elif "experience" in ans.question_id:
-        profile["experience"] = final_answers[0]
-    elif "goal" in ans.question_id:
-        profile.setdefault("goals", []).extend(final_answers)
-    elif ans.question_id == "study_time":
-        profile["time_commitment"] = final_answers[0]
-    elif ans.question_id == "learning_style":
-        profile["learning_style"] = final_answers
-    elif ans.question_id == "budget":
-        profile["budget"] = final_answers[0]
-    elif ans.question_id == "location_preference":
-        profile["location"] = final_answers[0]
-    
-    # Determine next question
-    next_q_id = agent.get_next_question(ans.question_id, final_answers)
-    
-    if next_q_id and next_q_id in QUESTION_TREE:
+    QUESTION_ROUTES.apply_answer(session["profile"], ans.question_id, final_answers)
+    
+    # Determine next question from the selected options ("Other (Specify)" routes like any option)
+    session["pending_question"] = QUESTION_ROUTES.next_question(ans.question_id, ans.answers)
+    return session["pending_question"]
+
+def pending_question(session: Dict) -> Optional[str]:
+    """The question a session is waiting on, or None once its path has ended"""
+    if "pending_question" in session:
+        return session["pending_question"]
+    # Sessions stored before the pending question was recorded: replay their answers
+    q_id = "start"
+    while q_id in session["answers"]:
+        answers = session["answers"][q_id]["answers"]
+        q_id = QUESTION_ROUTES.next_question(q_id, ["Other (Specify)" if a.startswith("Other: ") else a for a in answers])
+    return q_id
+
+def answer_error(question: Dict, answers: List[str]) -> Optional[str]:
+    """Why these selections are not a valid answer to the question, if they are not"""
+    if not answers:
+        return "no option selected"
+    if question["type"] == "single" and len(answers) != 1:
+        return "exactly one option must be selected"
+    if question.get("max_selections") and len(answers) > question["max_selections"]:
+        return f"at most {question['max_selections']} options may be selected"
+    unknown = [a for a in answers if a not in question["options"]]
+    if unknown:
+        return f"unknown option(s): {', '.join(unknown)}"
+    return None
+
+@app.post("/answer")
+async def submit_answer(ans: QuestionAnswer):
+    sid = ans.session_id or new_session_id()
+    
+    next_q_id = None
+    def apply(session):
+        nonlocal next_q_id
+        next_q_id = record_answer(session, ans)
+    await sessions.update(sid, apply, create=True)
+    
+    if next_q_id:
         next_question = QUESTION_TREE[next_q_id]
         return {
             "success": True,
@@ -1266,39 +4197,347 @@ async def submit_answer(ans: QuestionAnswer):
             "message": "Questionnaire completed! Ready for chat."
         }
 
+@app.post("/answers/batch")
+async def submit_answers_batch(batch: BatchAnswers):
+    """Validate a whole answer path in one pass and store it with a single write"""
+    if not batch.answers:
+        raise HTTPException(400, "No answers submitted")
+    
+    session = await sessions.get(batch.session_id)
+    sid = batch.session_id or new_session_id()
+    
+    # A new session walks the tree from the start; an existing one resumes at its pending question
+    expected = "start" if session is None else pending_question(session)
+    if session is not None and batch.answers[0].question_id != expected:
+        if expected is None:
+            raise HTTPException(409, "Questionnaire already completed for this session")
+        raise HTTPException(409, f"Session is waiting on question '{expected}', got '{batch.answers[0].question_id}'")
+    for position, ans in enumerate(batch.answers):
+        if expected is None:
+            raise HTTPException(400, f"Answer {position}: questionnaire already ended before '{ans.question_id}'")
+        if ans.question_id != expected:
+            raise HTTPException(400, f"Answer {position}: expected question '{expected}', got '{ans.question_id}'")
+        question = QUESTION_TREE.get(ans.question_id)
+        if question is None:
+            raise HTTPException(400, f"Answer {position}: unknown question '{ans.question_id}'")
+        error = answer_error(question, ans.answers)
+        if error:
+            raise HTTPException(400, f"Answer {position} ('{ans.question_id}'): {error}")
+        expected = QUESTION_ROUTES.next_question(ans.question_id, ans.answers)
+    
+    next_q_id = None
+    def apply(session):
+        nonlocal next_q_id
+        # Re-checked on the stored copy: another request may have answered meanwhile
+        if pending_question(session) != batch.answers[0].question_id:
+            raise HTTPException(409, "Session moved on to another question meanwhile")
+        for ans in batch.answers:
+            next_q_id = record_answer(session, ans)
+    session = await sessions.update(sid, apply, create=True)
+    
+    result = {
+        "success": True,
+        "session_id": sid,
+        "answered": len(batch.answers),
+        "profile": session["profile"],
+        "completed": next_q_id is None
+    }
+    if next_q_id:
+        result["next_question"] = QUESTION_TREE[next_q_id]
+    else:
+        result["message"] = "Questionnaire completed! Ready for chat."
+    return result
+
 @app.post("/chat")
 async def chat(msg: ChatMessage):
-    if msg.session_id not in user_sessions:
+    session = await sessions.get(msg.session_id)
+    if session is None:
         raise HTTPException(404, "Complete questions first")
     
-    profile = user_sessions[msg.session_id]["profile"]
-    result = await agent.chat(msg.session_id, msg.message, profile)
-    
-    needs_regen = False
-    if "analysis" in user_sessions[msg.session_id]:
-        user_sessions[msg.session_id]["needs_regeneration"] = True
-        needs_regen = True
+    history = list(session.get("chat_history", []))
+    asked = len(history)
+    result = await agent.chat(history, msg.message, session["profile"])
+    session = await append_chat_turns(msg.session_id, history[asked:])
     
     return {
         "success": result["success"], 
         "response": result["response"],
-        "needs_regeneration": needs_regen
+        "needs_regeneration": session is not None and "analysis" in session
     }
 
+@app.post("/chat/stream")
+async def chat_stream(msg: ChatMessage):
+    """Stream the coach reply as NDJSON token events, then a final done event"""
+    session = await sessions.get(msg.session_id)
+    if session is None:
+        raise HTTPException(404, "Complete questions first")
+    
+    llm_scheduler.check_capacity()
+    history = list(session.get("chat_history", []))
+    asked = len(history)
+    
+    async def events():
+        async for event in agent.chat_stream(history, msg.message, session["profile"]):
+            if event["event"] == "done":
+                stored = await append_chat_turns(msg.session_id, history[asked:])
+                event["needs_regeneration"] = stored is not None and "analysis" in stored
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+async def append_chat_turns(session_id: str, turns: List) -> Optional[Dict]:
+    """Add one exchange to the stored chat (re-read, so turns and analyses saved while
+    the reply was generating are kept), mark the analysis stale and trim the buffer"""
+    evicted = []
+    def apply(session):
+        nonlocal evicted
+        session.setdefault("chat_history", []).extend(turns)
+        if "analysis" in session:
+            session["needs_regeneration"] = True
+        evicted = trim_chat_history(session)
+    session = await sessions.update(session_id, apply)
+    schedule_chat_summary(session_id, evicted)
+    return session
+
+def trim_chat_history(session: Dict) -> List:
+    """Cap the verbatim chat at CHAT_HISTORY_MAX messages by evicting the oldest half;
+    returns the evicted messages for the rolling summary"""
+    history = session.get("chat_history", [])
+    turns = chat_turns(history)
+    if len(turns) <= CHAT_HISTORY_MAX:
+        return []
+    evict = len(turns) - CHAT_HISTORY_MAX // 2
+    while evict < len(turns) - 1 and turns[evict]['role'] != 'user':
+        evict += 1  # keep whole exchanges
+    evicted = turns[:evict]
+    old_offset = len(history) - len(turns)
+    history[:] = [{"role": CHAT_SUMMARY_ROLE, "content": chat_summary(history)}] + turns[evict:]
+    # Keep the incremental-regeneration mark pointing at the same message
+    if "analysis_chat_len" in session:
+        session["analysis_chat_len"] = 1 + max(session["analysis_chat_len"] - old_offset - evict, 0)
+    return evicted
+
+summarizing = {}  # session id -> latest rolling-summary task
+
+def schedule_chat_summary(session_id: str, evicted: List):
+    """Fold evicted messages into the session's summary in the background, one update
+    at a time per session so none is lost"""
+    if not evicted:
+        return
+    task = asyncio.ensure_future(update_chat_summary(session_id, evicted, summarizing.get(session_id)))
+    summarizing[session_id] = task
+    task.add_done_callback(lambda t: summarizing.pop(session_id, None) if summarizing.get(session_id) is t else None)
+
+async def update_chat_summary(session_id: str, evicted: List, previous: Optional[asyncio.Task]):
+    if previous is not None:
+        await asyncio.wait([previous])
+    session = await sessions.get(session_id)
+    if session is None:
+        return
+    summary = await agent.summarize_chat(chat_summary(session.get("chat_history", [])), evicted)
+    
+    def apply(session):
+        history = session.get("chat_history")
+        if history and history[0]['role'] == CHAT_SUMMARY_ROLE:
+            history[0]['content'] = summary
+    await sessions.update(session_id, apply)
+
+async def reuse_analysis(sid: str, session: Dict, cache_key: str) -> Optional[Dict]:
+    """An analysis that avoids a full generation: an exact cache hit, the stored
+    analysis with only the sections touched by new chat topics regenerated, or a
+    precomputed one from the warm store"""
+    analysis = await analysis_cache.get(cache_key)
+    if analysis is not None:
+        analysis_sources.inc(source="cache")
+        return analysis
+    
+    previous = session.get("analysis")
+    if not previous or not session.get("needs_regeneration") or not is_reusable(previous):
+        return warm_analysis(session["profile"], session.get("chat_history", []))
+    
+    chat_history = session.get("chat_history", [])
+    new_messages = chat_history[session.get("analysis_chat_len", 0):]
+    analysis = await agent.regenerate_sections(sid, session["profile"], chat_history, previous, new_messages)
+    if analysis is None:
+        return None  # fall through to a full generation
+    await analysis_cache.put(cache_key, analysis)
+    analysis_sources.inc(source="incremental")
+    return analysis
+
+def warm_analysis(profile: Dict, chat_history: List) -> Optional[Dict]:
+    """The precomputed analysis for this profile's track, if the user has not yet
+    chatted about anything the warm-up run could not have known"""
+    if warm_store is None or recent_chat_topics(chat_history):
+        return None
+    analysis = warm_store.get(profile)
+    if analysis is not None:
+        analysis["source"] = "warm"
+        analysis_sources.inc(source="warm")
+    return analysis
+
+personalizing = {}  # cache key -> background personalization task
+
+def template_analysis(session_id: str, profile: Dict, chat_history: List, cache_key: str) -> Optional[Dict]:
+    """In ANALYSIS_TEMPLATES=primary mode, the instant template analysis for a covered
+    profile; the LLM personalizes it in the background and the result lands in the
+    analysis cache, so the next /analyze returns the personalized version"""
+    if ANALYSIS_TEMPLATES != "primary":
+        return None
+    analysis = TEMPLATE_ENGINE.analyze(profile)
+    if analysis is None:
+        return None
+    analysis_sources.inc(source="template")
+    schedule_personalization(session_id, profile, chat_history, cache_key, analysis)
+    return analysis
+
+async def similar_analysis(session_id: str, profile: Dict, chat_history: List, cache_key: str) -> Optional[Dict]:
+    """The analysis of the most similar profile analysed so far, when it clears
+    SIMILAR_THRESHOLD. In SIMILAR_REUSE=seed mode it is served at once and the LLM
+    rewrites its job-search and advice sections for this profile in the background.
+    Indexed analyses never reflect a chat, so sessions with chat topics get none"""
+    if SIMILAR_REUSE == "off" or recent_chat_topics(chat_history):
+        return None
+    match = profile_index.nearest(profile, SIMILAR_THRESHOLD)
+    if match is None:
+        return None
+    neighbour_key, similarity = match
+    analysis = await analysis_cache.get(neighbour_key)
+    if analysis is None:
+        profile_index.remove(neighbour_key)  # expired or evicted from the cache
+        return None
+    
+    analysis.pop("personalized_sections", None)
+    analysis["source"] = "similar"
+    analysis["similarity"] = round(similarity, 3)
+    analysis_sources.inc(source="similar")
+    if SIMILAR_REUSE == "seed":
+        schedule_personalization(session_id, profile, chat_history, cache_key, analysis)
+    return analysis
+
+def is_reusable(analysis: Dict) -> bool:
+    """Whether an analysis may be served to anyone but its own session: not a fallback,
+    and no section filled in with template or generic content (defaulted_sections)"""
+    return not (analysis.get("is_fallback") or analysis.get("defaulted_sections"))
+
+async def share_analysis(cache_key: str, profile: Dict, chat_history: List, analysis: Dict):
+    """Count a freshly generated analysis and, if reusable, cache and index it"""
+    analysis_sources.inc(source="fallback" if analysis.get("is_fallback") else "llm")
+    if is_reusable(analysis):
+        await analysis_cache.put(cache_key, analysis)
+        index_analysis(cache_key, profile, chat_history, analysis)
+
+def index_analysis(cache_key: str, profile: Dict, chat_history: List, analysis: Dict):
+    """Make a freshly generated analysis findable by similar profiles. Only reusable
+    analyses that do not depend on chat topics qualify"""
+    if SIMILAR_REUSE != "off" and is_reusable(analysis) and not recent_chat_topics(chat_history):
+        profile_index.add(cache_key, profile)
+
+def schedule_personalization(session_id: str, profile: Dict, chat_history: List, cache_key: str, analysis: Dict):
+    """Personalize a stand-in analysis in the background (once per cache key) and mark it pending"""
+    if cache_key not in personalizing:
+        task = asyncio.ensure_future(
+            personalize_in_background(session_id, copy.deepcopy(profile), list(chat_history), cache_key, analysis)
+        )
+        personalizing[cache_key] = task
+        task.add_done_callback(lambda _: personalizing.pop(cache_key, None))
+    analysis["personalization_pending"] = True
+
+async def personalize_in_background(session_id: str, profile: Dict, chat_history: List, cache_key: str, base: Dict):
+    try:
+        analysis = await agent.personalize(session_id, profile, chat_history, base)
+    except Exception as e:
+        print(f"Personalization error: {e}")
+        return
+    if not analysis["is_personalized"]:
+        return
+    await analysis_cache.put(cache_key, analysis)
+    await store_analysis(session_id, analysis, chat_history, cache_key)
+
+async def store_analysis(session_id: str, analysis: Dict, chat_history: List, cache_key: Optional[str] = None):
+    """Attach an analysis of chat_history to the stored session. The session is re-read,
+    so chat turns saved while the analysis was generating are kept and leave it marked
+    for regeneration; with a cache_key, the analysis is only attached while the session
+    still matches it"""
+    def apply(session):
+        history = session.get("chat_history", [])
+        if cache_key is not None and analysis_cache_key(session["profile"], history) != cache_key:
+            return
+        session["analysis"] = analysis
+        if history == chat_history:
+            session["analysis_chat_len"] = len(history)
+            session["needs_regeneration"] = False
+            return
+        # Point the incremental-regeneration mark just past the last analysed message,
+        # or at the first verbatim turn if trimming has evicted it since
+        analysed = len(history) - len(chat_turns(history))
+        if chat_history:
+            for i in range(len(history) - 1, analysed - 1, -1):
+                if history[i] == chat_history[-1]:
+                    analysed = i + 1
+                    break
+        session["analysis_chat_len"] = analysed
+        session["needs_regeneration"] = True
+    await sessions.update(session_id, apply)
+
 @app.post("/analyze")
 async def analyze(data: dict):
     session_id = data.get("session_id")
-    if session_id not in user_sessions:
+    session = await sessions.get(session_id)
+    if session is None:
         raise HTTPException(404, "Session not found")
     
-    profile = user_sessions[session_id]["profile"]
-    chat_history = agent.chat_histories.get(session_id, [])
-    analysis = await agent.generate_analysis(session_id, profile, chat_history)
+    profile = session["profile"]
+    chat_history = list(session.get("chat_history", []))  # the stored list may grow meanwhile
+    cache_key = analysis_cache_key(profile, chat_history)
+    analysis = await reuse_analysis(session_id, session, cache_key)
+    if analysis is None:
+        analysis = await similar_analysis(session_id, profile, chat_history, cache_key)
+    if analysis is None:
+        analysis = template_analysis(session_id, profile, chat_history, cache_key)
+    if analysis is None:
+        analysis = await agent.generate_analysis(session_id, profile, chat_history)
+        await share_analysis(cache_key, profile, chat_history, analysis)
     
-    user_sessions[session_id]["analysis"] = analysis
-    user_sessions[session_id]["needs_regeneration"] = False
+    await store_analysis(session_id, analysis, chat_history)
     return analysis
 
+@app.post("/analyze/stream")
+async def analyze_stream(data: dict):
+    """Stream the analysis as NDJSON: one event per finished section, then the full result"""
+    session_id = data.get("session_id")
+    session = await sessions.get(session_id)
+    if session is None:
+        raise HTTPException(404, "Session not found")
+    
+    profile = session["profile"]
+    chat_history = list(session.get("chat_history", []))  # the stored list may grow meanwhile
+    cache_key = analysis_cache_key(profile, chat_history)
+    
+    async def replay(analysis):
+        for key in ANALYSIS_SECTIONS.values():
+            if analysis.get(key):
+                yield {"event": "section", "section": key, "data": analysis[key]}
+        yield {"event": "done", "analysis": analysis}
+    
+    ready = await reuse_analysis(session_id, session, cache_key)
+    if not ready:
+        ready = await similar_analysis(session_id, profile, chat_history, cache_key)
+    if not ready:
+        ready = template_analysis(session_id, profile, chat_history, cache_key)
+    if not ready:
+        llm_scheduler.check_capacity()
+    
+    async def events():
+        source = replay(ready) if ready else agent.stream_analysis(session_id, profile, chat_history)
+        async for event in source:
+            if event["event"] == "done":
+                if not ready:
+                    await share_analysis(cache_key, profile, chat_history, event["analysis"])
+                await store_analysis(session_id, event["analysis"], chat_history)
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     print("🎯 AI Career Guidance - Dynamic Questionnaire System v6.0")
     print("📍 http://localhost:8000")
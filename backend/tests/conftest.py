@@ -0,0 +1,13 @@
+"""main.py reads its settings at import time, so the offline configuration is set before
+any test imports it"""
+import os
+import sys
+
+os.environ.setdefault("LLM_BACKEND", "mock")
+os.environ.setdefault("LLM_MOCK_LATENCY", "0")
+os.environ.setdefault("LLM_MOCK_TOKEN_RATE", "0")
+os.environ.setdefault("LLM_LOG_TOKENS", "0")
+os.environ.setdefault("WARM_STORE_PATH", "")
+os.environ.setdefault("SESSION_BACKEND", "memory")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
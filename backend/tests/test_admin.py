@@ -0,0 +1,27 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+
+
+def get_loop_report(headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/admin/loop", headers=headers or {})
+    return asyncio.run(run())
+
+
+def test_loop_report_is_off_without_an_admin_token(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    assert get_loop_report().status_code == 404
+    assert get_loop_report({"X-Admin-Token": ""}).status_code == 404
+
+
+@pytest.mark.parametrize("token,status", [(None, 403), ("wrong", 403), ("secret", 200)])
+def test_loop_report_needs_the_admin_token(monkeypatch, token, status):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    response = get_loop_report({"X-Admin-Token": token} if token else None)
+    assert response.status_code == status
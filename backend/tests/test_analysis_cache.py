@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+
+PROFILE = {"education_level": "Undergraduate", "interests": ["Biology"]}
+LATEST = ["What should I do next?", "Is it a good time?", "How long will it take?", "Thanks, anything else?"]
+
+
+def history(earlier, summary=None):
+    messages = [{"role": main.CHAT_SUMMARY_ROLE, "content": summary}] if summary else []
+    for text in earlier + LATEST:
+        messages += [{"role": "user", "content": text}, {"role": "assistant", "content": "Sure."}]
+    return messages
+
+
+def test_histories_differing_only_in_the_summary_get_different_keys():
+    medicine = history([], summary="The user wants to become a doctor and asked about NEET.")
+    finance = history([], summary="The user is switching to finance and asked about CFA.")
+    assert main.recent_chat_topics(medicine) == main.recent_chat_topics(finance)
+    assert main.analysis_cache_key(PROFILE, medicine) != main.analysis_cache_key(PROFILE, finance)
+
+
+def test_earlier_turns_in_the_prompt_window_are_part_of_the_key():
+    medicine = history(["I want to study medicine"])
+    finance = history(["I want to move into finance"])
+    assert main.agent._chat_context(medicine) != main.agent._chat_context(finance)
+    assert main.analysis_cache_key(PROFILE, medicine) != main.analysis_cache_key(PROFILE, finance)
+
+
+def test_turns_outside_the_prompt_window_do_not_change_the_key(monkeypatch):
+    monkeypatch.setattr(main, "ANALYSIS_CHAT_TOKENS", 36)  # room for the latest four turns only
+    medicine = history(["I want to study medicine"])
+    finance = history(["I want to move into finance"])
+    assert main.agent._chat_context(medicine) == main.agent._chat_context(finance)
+    assert main.analysis_cache_key(PROFILE, medicine) == main.analysis_cache_key(PROFILE, finance)
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """A fresh session whose generated analysis had a section filled in by default"""
+    monkeypatch.setattr(main, "sessions", main.TimedSessionStore(main.InMemorySessionStore(100, 3600, 10 * 1024 * 1024)))
+    monkeypatch.setattr(main, "profile_index", main.ProfileIndex(100))
+    monkeypatch.setattr(main, "SIMILAR_REUSE", "return")
+    monkeypatch.setattr(main, "ANALYSIS_TEMPLATES", "off")
+    analysis = {"summary": "partly generic", "defaulted_sections": ["roadmap"]}
+
+    async def generate_analysis(session_id, profile, chat_history):
+        return dict(analysis)
+
+    async def stream_analysis(session_id, profile, chat_history):
+        yield {"event": "done", "analysis": dict(analysis)}
+
+    monkeypatch.setattr(main.agent, "generate_analysis", generate_analysis)
+    monkeypatch.setattr(main.agent, "stream_analysis", stream_analysis)
+    profile = {"education_level": "Undergraduate", "interests": ["Defaulted sections"]}
+    asyncio.run(main.sessions.update("defaulted", lambda s: s.update(profile=profile), create=True))
+    return profile
+
+
+async def analyze_stream(data):
+    response = await main.analyze_stream(data)
+    return [json.loads(line) async for line in response.body_iterator][-1]["analysis"]
+
+
+@pytest.mark.parametrize("endpoint", [main.analyze, analyze_stream], ids=["analyze", "analyze_stream"])
+def test_defaulted_analyses_are_not_shared(generated, endpoint):
+    async def run():
+        analysis = await endpoint({"session_id": "defaulted"})
+        assert analysis["defaulted_sections"] == ["roadmap"]
+        assert await main.analysis_cache.get(main.analysis_cache_key(generated, [])) is None
+        assert len(main.profile_index) == 0
+        # The session still gets its own analysis
+        assert (await main.sessions.get("defaulted"))["analysis"]["summary"] == "partly generic"
+
+    asyncio.run(run())
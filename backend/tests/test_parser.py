@@ -0,0 +1,96 @@
+"""Golden corpus for AnalysisParser: each entry of parser_corpus.jsonl is a completion in
+the emoji-headed text format and the analysis it must parse to. "source" says whether
+the completion was recorded from a model or written by hand; completions captured with
+LLM_RECORD_PATH can be added as "recording" entries. Plain-format entries are also
+checked against the parser AnalysisParser replaced (benchmark.baseline_parse)."""
+import json
+import os
+import timeit
+
+import pytest
+
+import benchmark
+import main
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+CORPUS = load_jsonl(os.path.join(HERE, "parser_corpus.jsonl"))
+PLAIN = [case for case in CORPUS if case["format"] == "plain"]
+RECORDINGS = [r["completion"] for r in load_jsonl(main.LLM_MOCK_RECORDINGS) if r["kind"] == "text"]
+LABELS = {main.ANALYSIS_SECTIONS[section]: spec[2] for section, spec in main.LIST_SECTIONS.items()}
+
+
+def ids(cases):
+    return [case["name"] for case in cases]
+
+
+def feed_lines(text):
+    """Parse the way /analyze/stream does, one line at a time"""
+    parser = main.AnalysisParser()
+    closed = [parser.feed(line) for line in text.split("\n")]
+    closed.append(parser.close())
+    return parser.result, [section for section in closed if section]
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=ids(CORPUS))
+def test_golden_corpus(case):
+    assert main.AnalysisParser.parse(case["completion"]) == case["expected"]
+
+
+@pytest.mark.parametrize("case", CORPUS, ids=ids(CORPUS))
+def test_streaming_matches_whole_text_and_closes_sections_in_order(case):
+    result, closed = feed_lines(case["completion"])
+    assert result == case["expected"]
+    order = [section for _, section in main.SECTION_HEADERS]
+    assert len(closed) == len(set(closed))
+    assert closed == sorted(closed, key=order.index)
+
+
+def test_acronym_led_advice_lines_are_not_headers():
+    advice = main.AnalysisParser.parse(
+        "💡 PERSONALIZED ADVICE\n"
+        "Start small.\n"
+        "SQL and Python projects will set you apart.\n"
+        "AWS certifications can come later.\n"
+    )["final_advice"]
+    assert advice == "Start small. SQL and Python projects will set you apart. AWS certifications can come later."
+
+
+def names(result, key, field):
+    """Item names, without the detail lines the baseline also turned into items"""
+    return [item[field] for item in result[key] if not item[field].startswith(LABELS[key])]
+
+
+@pytest.mark.parametrize("case", PLAIN, ids=ids(PLAIN))
+def test_plain_format_agrees_with_the_baseline_parser(case):
+    old = benchmark.baseline_parse(case["completion"])
+    new = main.AnalysisParser.parse(case["completion"])
+
+    assert [(c["title"], c["match"]) for c in old["career_matches"]] == [(c["title"], c["match"]) for c in new["career_matches"]]
+    for key, field in (("missing_skills", "skill"), ("certifications", "name"), ("projects", "name")):
+        assert names(old, key, field) == names(new, key, field)
+    assert list(old["roadmap"]) == list(new["roadmap"])
+    assert [actions[:1] for actions in old["roadmap"].values()] == [actions[:1] for actions in new["roadmap"].values()]
+    assert {k.lstrip("-• "): v for k, v in old["job_search"].items()} == new["job_search"]
+    assert old["final_advice"] == new["final_advice"]
+
+
+def test_faster_than_the_baseline_parser():
+    texts = [case["completion"] for case in CORPUS]
+
+    def cpu(parse):
+        return min(timeit.repeat(lambda: [parse(text) for text in texts], number=50, repeat=5))
+
+    assert cpu(main.AnalysisParser.parse) < cpu(benchmark.baseline_parse)
+
+
+@pytest.mark.parametrize("text", RECORDINGS)
+def test_mock_recordings_fill_every_section(text):
+    result = main.AnalysisParser.parse(text)
+    assert all(result[key] for key in main.ANALYSIS_SCHEMA)
@@ -0,0 +1,64 @@
+import asyncio
+import math
+
+import main
+
+
+def profile(i, skill):
+    return {"education_level": "Undergraduate", "skills": [skill], "location": f"City {i % 7}"}
+
+
+def expected_idf(index, term):
+    df = sum(1 for _, terms, _ in index._docs.values() if term in terms)
+    return math.log((1 + len(index)) / (1 + df)) + 1
+
+
+def test_full_index_keeps_refitting_while_it_churns():
+    index = main.ProfileIndex(64)
+    for i in range(64):
+        index.add(f"old{i}", profile(i, "Excel"))
+    fitted = dict(index._idf)
+
+    # A full index only churns: every add evicts the oldest entry and never grows it
+    for i in range(200):
+        index.add(f"new{i}", profile(i, "Python"))
+    assert len(index) == 64
+    assert "skills=python" in index._idf and "skills=excel" not in index._idf
+    assert index._idf != fitted
+    assert index._idf["skills=python"] == expected_idf(index, "skills=python")
+
+
+def test_refits_are_amortized():
+    index = main.ProfileIndex(1000)
+    refits = 0
+    original = index._refit
+
+    def counting_refit():
+        nonlocal refits
+        refits += 1
+        original()
+
+    index._refit = counting_refit
+    for i in range(4000):
+        index.add(f"k{i}", profile(i, f"Skill {i % 50}"))
+    # About 19 refits growing by quarters to the cap, then 24 in churn: each add also
+    # evicts, so the quarter-of-the-index change budget is spent every 125 adds
+    assert refits <= 45
+
+
+def test_sessions_with_chat_topics_get_no_neighbour(monkeypatch):
+    monkeypatch.setattr(main, "SIMILAR_REUSE", "return")
+    monkeypatch.setattr(main, "profile_index", main.ProfileIndex(100))
+    neighbour = profile(1, "Tableau")
+    chat = [{"role": "user", "content": "Should I switch to medicine?"}]
+
+    async def run():
+        key = main.analysis_cache_key(neighbour, [])
+        await main.analysis_cache.put(key, {"summary": "neighbour"})
+        main.index_analysis(key, neighbour, [], {"summary": "neighbour"})
+
+        assert await main.similar_analysis("s", dict(neighbour), chat, "own-key") is None
+        found = await main.similar_analysis("s", dict(neighbour), [], "own-key")
+        assert found["source"] == "similar"
+
+    asyncio.run(run())
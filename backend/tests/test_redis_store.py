@@ -0,0 +1,81 @@
+import asyncio
+import copy
+import json
+
+import pytest
+
+import main
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def store(server):
+    store = main.RedisSessionStore("redis://localhost:6379/0", 3600)
+    store._redis = fakeredis.FakeAsyncRedis(server=server)
+    return store
+
+
+def test_round_trip_and_idle_expiry(store):
+    async def run():
+        await store.update("a", lambda s: s["profile"].update(name="A"), create=True)
+        assert (await store.get("a"))["profile"] == {"name": "A"}
+        assert 0 < await store._redis.ttl(store.prefix + "a") <= 3600
+        assert await store.update("missing", lambda s: s.update(touched=True)) is None
+        assert await store.get("missing") is None
+
+    asyncio.run(run())
+
+
+def test_update_retries_when_another_writer_wins(store, server):
+    other = fakeredis.FakeAsyncRedis(server=server)
+    key = store.prefix + "s"
+    seen = []
+
+    def with_competing_write(pipeline):
+        """Another worker saves the session after our read, just before our EXEC"""
+        def patched(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def execute_after_competitor(*a, **kw):
+                if len(seen) == 1:
+                    await other.set(key, json.dumps({**seen[0], "turns": seen[0]["turns"] + ["theirs"]}), ex=3600)
+                return await execute(*a, **kw)
+
+            pipe.execute = execute_after_competitor
+            return pipe
+        return patched
+
+    def append(session):
+        seen.append(copy.deepcopy(session))
+        session["turns"].append("ours")
+
+    async def run():
+        await store.update("s", lambda s: s.update(turns=["first"]), create=True)
+        store._redis.pipeline = with_competing_write(store._redis.pipeline)
+        session = await store.update("s", append)
+
+        assert [s["turns"] for s in seen] == [["first"], ["first", "theirs"]]
+        assert session["turns"] == ["first", "theirs", "ours"]
+        assert (await store.get("s"))["turns"] == ["first", "theirs", "ours"]
+
+    asyncio.run(run())
+
+
+def test_count_only_counts_session_keys(store):
+    async def run():
+        await store._redis.set("unrelated:key", "1")
+        await store._redis.set("career:cache:x", "1")
+        for i in range(25):
+            await store.update(f"s{i}", lambda s: None, create=True)
+        assert await store.count() == 25
+        await store.delete("s0")
+        assert await store.count() == 24
+
+    asyncio.run(run())
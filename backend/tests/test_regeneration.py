@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+import main
+
+PREVIOUS = {"summary": "before the chat", "final_advice": "old advice"}
+
+
+@pytest.fixture
+def session():
+    return {
+        "profile": {"name": "regen", "interests": ["incremental regeneration tests"]},
+        "chat_history": [
+            {"role": "user", "content": "Which skills should I learn?"},
+            {"role": "assistant", "content": "Start with statistics."},
+        ],
+        "analysis": dict(PREVIOUS),
+        "analysis_chat_len": 0,
+        "needs_regeneration": True,
+    }
+
+
+def fan_out_returning(monkeypatch, sections):
+    async def fan_out(sid, profile, chat_history, keys):
+        return {key: value for key, value in sections.items() if key in keys}
+    monkeypatch.setattr(main.agent, "_fan_out_sections", fan_out)
+
+
+def test_failed_regeneration_is_not_cached(monkeypatch, session):
+    fan_out_returning(monkeypatch, {})
+
+    async def run():
+        key = main.analysis_cache_key(session["profile"], session["chat_history"])
+        assert await main.reuse_analysis("regen", session, key) is None
+        assert await main.analysis_cache.get(key) is None
+
+    asyncio.run(run())
+
+
+def test_partial_regeneration_is_not_cached(monkeypatch, session):
+    keys = main.agent.sections_affected(session["chat_history"])
+    assert len(keys) > 1
+    fan_out_returning(monkeypatch, {"final_advice": "new advice"})
+
+    async def run():
+        key = main.analysis_cache_key(session["profile"], session["chat_history"])
+        assert await main.reuse_analysis("regen", session, key) is None
+        assert await main.analysis_cache.get(key) is None
+
+    asyncio.run(run())
+
+
+def test_complete_regeneration_is_merged_and_cached(monkeypatch, session):
+    keys = main.agent.sections_affected(session["chat_history"])
+    fan_out_returning(monkeypatch, {key: f"new {key}" for key in keys})
+
+    async def run():
+        key = main.analysis_cache_key(session["profile"], session["chat_history"])
+        analysis = await main.reuse_analysis("regen", session, key)
+        assert analysis["regenerated_sections"] == keys
+        assert analysis["final_advice"] == "new final_advice"
+        assert analysis["summary"] == PREVIOUS["summary"]
+        assert (await main.analysis_cache.get(key))["regenerated_sections"] == keys
+
+    asyncio.run(run())
+
+
+def test_fan_out_cap_is_shared_by_a_sessions_concurrent_analyses(monkeypatch):
+    monkeypatch.setattr(main, "ANALYSIS_FANOUT_CONCURRENCY", 2)
+    running = {}
+    peak = {}
+
+    async def request_json_sections(profile, chat_history, keys, max_tokens):
+        sid = profile["name"]
+        running[sid] = running.get(sid, 0) + 1
+        peak[sid] = max(peak.get(sid, 0), running[sid])
+        await asyncio.sleep(0.01)
+        running[sid] -= 1
+        return {keys[0]: f"new {keys[0]}"}
+
+    monkeypatch.setattr(main.agent, "_request_json_sections", request_json_sections)
+    keys = list(main.ANALYSIS_SCHEMA)
+
+    async def run():
+        await asyncio.gather(*(
+            main.agent._fan_out_sections(sid, {"name": sid}, [], keys)
+            for sid in ("a", "a", "a", "b")
+        ))
+
+    asyncio.run(run())
+    assert peak == {"a": 2, "b": 2}
+    assert main.agent._fanout_limits == {}
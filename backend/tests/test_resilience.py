@@ -0,0 +1,203 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+def make_caller(retries=2, threshold=3, cooldown=0.05, **kwargs):
+    breaker = main.CircuitBreaker(threshold, cooldown)
+    return main.ResilientCaller(retries, 0.001, 0.002, breaker, **kwargs)
+
+
+def test_cancelled_half_open_probe_releases_the_breaker():
+    async def run():
+        caller = make_caller(retries=0, threshold=1)
+        caller.breaker.record_failure()
+        assert caller.breaker.state == "open"
+        await asyncio.sleep(0.06)
+
+        probe = asyncio.ensure_future(caller.call(lambda: asyncio.sleep(10), timeout=5))
+        await asyncio.sleep(0.01)
+        assert caller.breaker.state == "half_open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        # The next call is let through as the new probe instead of being rejected forever
+        assert await caller.call(lambda: asyncio.sleep(0, result="ok"), timeout=1) == "ok"
+        assert caller.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def flaky(failures, error=None, result="ok", delay=0.0):
+    """make_call that fails `failures` times, then succeeds"""
+    calls = []
+
+    async def make_call():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if len(calls) <= failures:
+            raise error or main.MockLLMError("injected")
+        return result
+    return make_call, calls
+
+
+def test_transient_errors_are_retried():
+    caller = make_caller(retries=2)
+    make_call, calls = flaky(2)
+    assert asyncio.run(caller.call(make_call, timeout=1)) == "ok"
+    assert len(calls) == 3
+    assert caller.retried == 2
+    assert caller.breaker.state == "closed"
+
+
+def test_client_errors_are_not_retried_and_do_not_trip_the_breaker():
+    caller = make_caller(retries=2, threshold=1)
+    make_call, calls = flaky(5, error=main.LLMHTTPError(400, "bad request"))
+    with pytest.raises(main.LLMHTTPError):
+        asyncio.run(caller.call(make_call, timeout=1))
+    assert len(calls) == 1
+    assert caller.breaker.state == "closed"
+
+
+def test_deadline_bounds_a_latency_spike():
+    caller = make_caller(retries=2)
+    make_call, calls = flaky(0, delay=1.0)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(caller.call(make_call, timeout=0.05))
+
+
+def test_breaker_opens_rejects_and_recovers_through_a_probe():
+    async def run():
+        caller = make_caller(retries=0, threshold=3, cooldown=0.05)
+        failing, _ = flaky(100)
+        for _ in range(3):
+            with pytest.raises(main.MockLLMError):
+                await caller.call(failing, timeout=1)
+        assert caller.breaker.state == "open"
+
+        healthy, calls = flaky(0)
+        with pytest.raises(main.CircuitOpen):
+            await caller.call(healthy, timeout=1)
+        assert not calls and caller.breaker.rejections == 1
+
+        await asyncio.sleep(0.06)
+        assert await caller.call(healthy, timeout=1) == "ok"
+        assert caller.breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_failed_probe_reopens_the_breaker():
+    async def run():
+        caller = make_caller(retries=0, threshold=1, cooldown=0.05)
+        failing, _ = flaky(100)
+        with pytest.raises(main.MockLLMError):
+            await caller.call(failing, timeout=1)
+        await asyncio.sleep(0.06)
+        with pytest.raises(main.MockLLMError):
+            await caller.call(failing, timeout=1)
+        assert caller.breaker.state == "open"
+        with pytest.raises(main.CircuitOpen):
+            await caller.call(failing, timeout=1)
+
+    asyncio.run(run())
+
+
+def test_slow_call_is_hedged_and_the_fast_answer_wins():
+    async def run():
+        caller = make_caller(hedge=True, hedge_min_samples=5)
+        for _ in range(5):
+            await caller.call(lambda: asyncio.sleep(0.001, result="warm"), timeout=1, key=150)
+
+        delays = [0.5, 0.0]
+
+        async def make_call():
+            delay = delays.pop(0)
+            await asyncio.sleep(delay)
+            return f"slept {delay}"
+
+        started = asyncio.get_running_loop().time()
+        assert await caller.call(make_call, timeout=2, key=150) == "slept 0.0"
+        assert caller.hedged == 1
+        assert asyncio.get_running_loop().time() - started < 0.4
+
+    asyncio.run(run())
+
+
+def scheduled(scheduler, make_call):
+    """make_call that records how many scheduler slots are taken while it runs"""
+    in_flight = []
+
+    async def tracked():
+        in_flight.append(scheduler._in_flight)
+        return await make_call()
+    return tracked, in_flight
+
+
+def test_every_retry_is_admitted_by_the_scheduler_and_backoff_holds_no_slot():
+    async def run():
+        scheduler = main.LLMScheduler(max_concurrency=1, rate=1000, burst=10, max_queue=10)
+        caller = main.ResilientCaller(2, 0.05, 0.05, main.CircuitBreaker(5, 1))
+        make_call, calls = flaky(2)
+        make_call, in_flight = scheduled(scheduler, make_call)
+
+        task = asyncio.ensure_future(caller.call(make_call, timeout=2, admit=lambda: scheduler.admit(1)))
+        await asyncio.sleep(0.01)
+        # Backing off after the first failure: the slot is free for other callers
+        assert len(calls) == 1 and scheduler._in_flight == 0
+        assert await task == "ok"
+        assert scheduler.admitted == 3 == len(calls)
+        assert in_flight == [1, 1, 1] and scheduler._in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_hedges_stay_within_the_concurrency_limit():
+    async def run():
+        scheduler = main.LLMScheduler(max_concurrency=2, rate=1000, burst=100, max_queue=100)
+        caller = make_caller(hedge=True, hedge_min_samples=5)
+        admit = lambda: scheduler.admit(1)
+        for _ in range(5):
+            await caller.call(lambda: asyncio.sleep(0.001, result="warm"), timeout=1, key=150, admit=admit)
+
+        make_call, in_flight = scheduled(scheduler, lambda: asyncio.sleep(0.05, result="slow"))
+        results = await asyncio.gather(*(caller.call(make_call, timeout=2, key=150, admit=admit) for _ in range(4)))
+        assert results == ["slow"] * 4
+        assert caller.hedged > 0
+        await asyncio.sleep(0.01)  # let the cancelled losers hand back their slots
+        assert max(in_flight) <= 2 and scheduler._in_flight == 0
+        assert scheduler.admitted == 5 + len(in_flight)
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def failing_llm(monkeypatch):
+    """The app's LLM path on a mock that always fails after a short latency"""
+    backend = main.MockBackend(main.LLM_MOCK_RECORDINGS, latency=0.01, token_rate=0, error_rate=1.0)
+    caller = make_caller(retries=1, threshold=2, cooldown=60)
+    monkeypatch.setattr(main, "llm_backend", backend)
+    monkeypatch.setattr(main, "llm_caller", caller)
+    return caller
+
+
+def test_mock_errors_are_retried_then_answered_by_the_fallback(failing_llm):
+    async def run():
+        first = await main.agent.chat([], "How do I start?", {})
+        assert first == {"success": False, "response": main.CHAT_FALLBACK}
+        assert failing_llm.retried == 1
+        assert failing_llm.breaker.state == "open"
+
+        # With the circuit open the fallback answers without waiting on the provider
+        rejections = failing_llm.breaker.rejections
+        second = await main.agent.chat([], "And then?", {})
+        assert second["response"] == main.CHAT_FALLBACK
+        assert failing_llm.breaker.rejections == rejections + 1
+
+        analysis = await main.agent.generate_analysis("s", {"education_level": "Undergraduate (UG)"}, [])
+        assert analysis["is_fallback"]
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import main
+
+CONCURRENT = 500
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        inner = main.SQLiteSessionStore(str(tmp_path / "sessions.db"), 10_000, 3600)
+    else:
+        inner = main.InMemorySessionStore(10_000, 3600, 64 * 1024 * 1024)
+    store = main.TimedSessionStore(inner)
+    monkeypatch.setattr(main, "sessions", store)
+    return store
+
+
+def test_concurrent_first_answers_get_distinct_sessions(store):
+    first = main.QUESTION_TREE["start"]["options"][0]
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/answer", json={"question_id": "start", "answers": [first]})
+                for _ in range(CONCURRENT)
+            ))
+        return [r.json()["session_id"] for r in responses if r.status_code == 200]
+
+    ids = asyncio.run(run())
+    assert len(ids) == CONCURRENT
+    assert len(set(ids)) == CONCURRENT
+    # No first answer landed in (and overwrote) another user's session
+    assert asyncio.run(store.count()) == CONCURRENT
+
+
+def test_ids_are_unique_and_sort_by_creation_time():
+    earlier = [main.new_session_id() for _ in range(10_000)]
+    time.sleep(0.002)
+    later = main.new_session_id()
+
+    assert len(set(earlier)) == len(earlier)
+    assert all(len(sid) == 26 and set(sid) <= set(main.CROCKFORD_BASE32) for sid in earlier)
+    assert max(earlier) < later
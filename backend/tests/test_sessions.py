@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        inner = main.SQLiteSessionStore(str(tmp_path / "sessions.db"), 100, 3600)
+    else:
+        inner = main.InMemorySessionStore(100, 3600, 10 * 1024 * 1024)
+    store = main.TimedSessionStore(inner)
+    monkeypatch.setattr(main, "sessions", store)
+    return store
+
+
+@pytest.fixture
+def slow_analysis(monkeypatch):
+    """Only the LLM generation path, taking long enough for a chat to land meanwhile"""
+    monkeypatch.setattr(main, "SIMILAR_REUSE", "off")
+    monkeypatch.setattr(main, "ANALYSIS_TEMPLATES", "off")
+
+    async def generate_analysis(session_id, profile, chat_history):
+        await asyncio.sleep(0.05)
+        return {"summary": f"analysed {len(chat_history)} messages"}
+
+    monkeypatch.setattr(main.agent, "generate_analysis", generate_analysis)
+
+
+async def new_session(store, sid):
+    def apply(session):
+        session["profile"] = {"name": sid, "interests": ["session race tests"]}
+    await store.update(sid, apply, create=True)
+
+
+def test_chat_during_analyze_keeps_its_turn(store, slow_analysis):
+    async def run():
+        await new_session(store, "race")
+        analysis = asyncio.ensure_future(main.analyze({"session_id": "race"}))
+        await asyncio.sleep(0.01)
+        reply = await main.chat(main.ChatMessage(session_id="race", message="What about data science?"))
+        assert reply["success"]
+        await analysis
+
+        session = await store.get("race")
+        assert [m["role"] for m in session["chat_history"]] == ["user", "assistant"]
+        assert session["analysis"]["summary"] == "analysed 0 messages"
+        # The analysis predates the chat turn, so the turn is still to be folded in
+        assert session["needs_regeneration"] is True
+        assert session["analysis_chat_len"] == 0
+
+    asyncio.run(run())
+
+
+def test_concurrent_chats_all_land(store):
+    async def run():
+        await new_session(store, "chatty")
+        await asyncio.gather(*(
+            main.chat(main.ChatMessage(session_id="chatty", message=f"question {i}")) for i in range(5)
+        ))
+        session = await store.get("chatty")
+        asked = sorted(m["content"] for m in session["chat_history"] if m["role"] == "user")
+        assert asked == [f"question {i}" for i in range(5)]
+
+    asyncio.run(run())
+
+
+def test_update_skips_missing_session_unless_created(store):
+    async def run():
+        assert await store.update("missing", lambda s: s.update(touched=True)) is None
+        assert await store.get("missing") is None
+        session = await store.update("missing", lambda s: s.update(touched=True), create=True)
+        assert session["touched"] and (await store.get("missing"))["touched"]
+
+    asyncio.run(run())
+
+
+def test_failed_update_leaves_sqlite_session_unchanged(tmp_path):
+    async def run():
+        store = main.SQLiteSessionStore(str(tmp_path / "sessions.db"), 100, 3600)
+        await store.update("s", lambda s: s.update(step=1), create=True)
+
+        def broken(session):
+            session["step"] = 2
+            raise ValueError("mutation failed")
+
+        with pytest.raises(ValueError):
+            await store.update("s", broken)
+        assert (await store.get("s"))["step"] == 1
+
+    asyncio.run(run())
+
+
+def test_batch_for_an_existing_session_resumes_at_its_pending_question(store):
+    start = main.QUESTION_TREE["start"]
+    first = main.QuestionAnswer(question_id="start", answers=[start["options"][0]])
+    pending = main.QUESTION_ROUTES.next_question("start", first.answers)
+    elsewhere = next(q_id for q_id in main.QUESTION_TREE if q_id not in ("start", pending))
+
+    async def run():
+        created = await main.submit_answers_batch(main.BatchAnswers(answers=[first]))
+        sid = created["session_id"]
+
+        for question_id in (elsewhere, "start"):
+            question = main.QUESTION_TREE[question_id]
+            batch = main.BatchAnswers(session_id=sid, answers=[
+                main.QuestionAnswer(question_id=question_id, answers=[question["options"][0]])
+            ])
+            with pytest.raises(main.HTTPException) as rejected:
+                await main.submit_answers_batch(batch)
+            assert rejected.value.status_code == 409
+        assert list((await store.get(sid))["answers"]) == ["start"]
+
+        question = main.QUESTION_TREE[pending]
+        resumed = await main.submit_answers_batch(main.BatchAnswers(session_id=sid, answers=[
+            main.QuestionAnswer(question_id=pending, answers=[question["options"][0]])
+        ]))
+        assert resumed["answered"] == 1
+        assert list((await store.get(sid))["answers"]) == ["start", pending]
+
+    asyncio.run(run())
+
+
+def test_pending_question_is_replayed_for_sessions_stored_without_it():
+    start = main.QUESTION_TREE["start"]["options"][0]
+    session = {"answers": {"start": {"question": "", "answers": [start]}}}
+    assert main.pending_question(session) == main.QUESTION_ROUTES.next_question("start", [start])
@@ -0,0 +1,36 @@
+"""Soak: 100k abandoned questionnaire sessions through the bounded in-memory store"""
+import asyncio
+import gc
+import tracemalloc
+
+import main
+
+SESSIONS = 100_000
+STORE_MAX = 2_000
+
+
+def test_memory_stays_flat_over_100k_sessions(monkeypatch):
+    store = main.TimedSessionStore(main.InMemorySessionStore(STORE_MAX, 3600, 64 * 1024 * 1024))
+    monkeypatch.setattr(main, "sessions", store)
+    first = main.QUESTION_TREE["start"]["options"][0]
+
+    async def run():
+        samples = []
+        tracemalloc.start()
+        try:
+            for i in range(SESSIONS):
+                await main.submit_answer(main.QuestionAnswer(question_id="start", answers=[first]))
+                if (i + 1) % (SESSIONS // 10) == 0:
+                    gc.collect()
+                    samples.append(tracemalloc.get_traced_memory()[0])
+        finally:
+            tracemalloc.stop()
+        return samples
+
+    samples = asyncio.run(run())
+
+    assert asyncio.run(store.count()) == STORE_MAX
+    assert store.stats()["evictions"]["lru"] == SESSIONS - STORE_MAX
+    # Once the store is full, the next 90k sessions must not grow the heap
+    steady = samples[1:]
+    assert max(steady) - samples[0] < 1024 * 1024, [s // 1024 for s in samples]
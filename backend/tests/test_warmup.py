@@ -0,0 +1,37 @@
+import asyncio
+import copy
+
+import pytest
+
+import main
+import warmup
+
+PROFILE = {"education_level": "Undergraduate", "interests": ["Artificial Intelligence"]}
+
+
+@pytest.fixture(scope="module")
+def generated():
+    return asyncio.run(main.agent.generate_analysis("warmup-test", dict(PROFILE), []))
+
+
+def test_complete_analysis_is_stored(generated):
+    assert "defaulted_sections" not in generated
+    assert warmup.is_valid(generated)
+
+
+@pytest.mark.parametrize("template", ["primary", "off"])
+def test_defaulted_sections_are_rejected(generated, monkeypatch, template):
+    monkeypatch.setattr(main, "ANALYSIS_TEMPLATES", template)
+    analysis = copy.deepcopy(generated)
+    analysis["roadmap"] = []
+    analysis["final_advice"] = ""
+
+    analysis = main.agent._fill_defaults(analysis, dict(PROFILE))
+    assert analysis["defaulted_sections"] == ["roadmap", "final_advice"]
+    # The placeholder content passes the schema check on its own
+    assert main.validate_section("roadmap", analysis["roadmap"]) is not None
+    assert not warmup.is_valid(analysis)
+
+
+def test_fallback_is_rejected(generated):
+    assert not warmup.is_valid({**generated, "is_fallback": True})
@@ -0,0 +1,147 @@
+"""Offline warm-up: precompute analyses for every reachable QUESTION_TREE path.
+
+Walks the compiled question tree from "start", branching on every option of the
+questions that decide the career track (WARM_PROFILE_FIELDS: education level,
+stream, field and interests) and on one representative option per distinct route
+elsewhere. Multi-select questions branch on every combination of up to
+--max-selections options (never more than the question's own max_selections). Each
+distinct track profile is analysed once through CareerAgent.generate_analysis with
+bounded parallelism, validated, and written to the memory-mapped store that the
+server loads at startup (WARM_STORE_PATH).
+
+    python warmup.py --dry-run                  # count the profiles only
+    python warmup.py --concurrency 4 --max-selections 2
+    LLM_BACKEND=mock python warmup.py --limit 50 --output /tmp/warm.bin
+"""
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import main
+
+FREE_TEXT_OPTIONS = ("Other (Specify)",)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", help="store to write (default: WARM_STORE_PATH)")
+    parser.add_argument("--concurrency", type=int, default=4, help="analyses generated at once")
+    parser.add_argument("--max-selections", type=int, default=2,
+                        help="largest option combination tried on multi-select track questions")
+    parser.add_argument("--limit", type=int, default=0, help="generate at most this many new analyses (0 = all)")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore analyses already in the output store (use after editing the tree)")
+    parser.add_argument("--dry-run", action="store_true", help="enumerate and count profiles without generating")
+    return parser.parse_args(argv)
+
+def answer_choices(routes, q_id: str, max_selections: int) -> List[List[str]]:
+    """The answers worth exploring at one question"""
+    question = routes.questions[q_id]
+    options = [o for o in question.get("options", []) if o not in FREE_TEXT_OPTIONS]
+    mapping = routes.profile_fields.get(q_id)
+
+    if mapping is None or mapping[0] not in main.WARM_PROFILE_FIELDS:
+        # The answer cannot change the profile key, only the route
+        by_target = {}
+        for option in options:
+            by_target.setdefault(routes.next_question(q_id, [option]), [option])
+        return list(by_target.values())
+
+    if question.get("type") != "multiple":
+        return [[option] for option in options]
+    limit = min(max_selections, question.get("max_selections") or max_selections)
+    return [
+        list(combo)
+        for size in range(1, limit + 1)
+        for combo in itertools.combinations(options, size)
+    ]
+
+def enumerate_profiles(routes, max_selections: int) -> Dict[bytes, Dict]:
+    """Every distinct track profile reachable from "start", keyed by warm_profile_key"""
+    profiles = {}
+    seen = set()
+    stack = [("start", {})]
+    while stack:
+        q_id, profile = stack.pop()
+        if q_id is None:
+            profiles.setdefault(main.warm_profile_key(profile), profile)
+            continue
+        state = (q_id, json.dumps(main._normalize(profile), sort_keys=True))
+        if state in seen:
+            continue
+        seen.add(state)
+
+        mapping = routes.profile_fields.get(q_id)
+        feeds_key = mapping is not None and mapping[0] in main.WARM_PROFILE_FIELDS
+        for answers in answer_choices(routes, q_id, max_selections):
+            child = profile
+            if feeds_key:
+                child = copy.deepcopy(profile)
+                routes.apply_answer(child, q_id, answers)
+            stack.append((routes.next_question(q_id, answers), child))
+    return profiles
+
+def is_valid(analysis: Dict) -> bool:
+    """A real LLM analysis whose every section the model wrote and passes the schema check"""
+    if not main.is_reusable(analysis):
+        return False
+    return all(main.validate_section(key, analysis.get(key)) is not None for key in main.ANALYSIS_SCHEMA)
+
+async def generate(profiles: Dict[bytes, Dict], concurrency: int) -> Dict[bytes, Dict]:
+    results = {}
+    failed = 0
+    done = 0
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(key: bytes, profile: Dict):
+        nonlocal failed, done
+        async with semaphore:
+            try:
+                analysis = await main.agent.generate_analysis(f"warmup:{key.hex()}", copy.deepcopy(profile), [])
+            except Exception as e:
+                print(f"  error for {profile}: {e}")
+                analysis = {"is_fallback": True}
+        if is_valid(analysis):
+            results[key] = analysis
+        else:
+            failed += 1
+        done += 1
+        if done % 25 == 0 or done == len(profiles):
+            print(f"  {done}/{len(profiles)} generated, {failed} rejected, {time.perf_counter() - started:.0f}s")
+
+    await asyncio.gather(*(one(key, profile) for key, profile in profiles.items()))
+    return results
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    output = args.output or main.WARM_STORE_PATH
+
+    profiles = enumerate_profiles(main.QUESTION_ROUTES, args.max_selections)
+    print(f"{len(profiles)} distinct track profiles reachable (max {args.max_selections} selections per question)")
+
+    existing = {}
+    if not args.fresh:
+        store = main.WarmAnalysisStore.open(output)
+        if store is not None:
+            existing = dict(store.items())
+    pending = {k: p for k, p in profiles.items() if k not in existing}
+    if args.limit:
+        pending = dict(itertools.islice(pending.items(), args.limit))
+    print(f"{len(existing)} already in {output}, {len(pending)} to generate")
+    if args.dry_run or not pending:
+        return
+
+    generated = asyncio.run(generate(pending, args.concurrency))
+    entries = {**existing, **generated}
+    main.WarmAnalysisStore.write(output, entries)
+    print(f"Wrote {len(entries)} analyses ({os.path.getsize(output) / 1024:.0f} KB) to {output}")
+
+if __name__ == "__main__":
+    main_cli()